@@ -0,0 +1,93 @@
+"""Measure the size/CPU trade-off of gzip levels on representative API payloads.
+
+Usage: python benchmarks/compression.py [--orders 200] [--products 500]
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import gzip
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from src.models.product import Product, Order, OrderItem
+
+CATEGORIES = ['apparel', 'drinkware', 'prints', 'accessories', 'home']
+STATUSES = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
+
+def make_products(count, rng):
+    now = datetime(2025, 1, 1)
+    return [
+        Product(
+            id=index + 1,
+            name=f'Custom Pet Product {index}',
+            description='High-quality item featuring your pet\'s custom portrait',
+            price=round(rng.uniform(9, 99), 2),
+            category=rng.choice(CATEGORIES),
+            image_url=f'/uploads/{rng.getrandbits(128):032x}.jpg',
+            stock_quantity=rng.randint(0, 200),
+            is_featured=rng.random() < 0.2,
+            is_active=True,
+            created_at=now,
+            updated_at=now + timedelta(days=rng.randint(0, 90))
+        )
+        for index in range(count)
+    ]
+
+def make_orders(count, products, rng):
+    orders = []
+    for index in range(count):
+        created = datetime(2025, 1, 1) + timedelta(minutes=rng.randint(0, 500000))
+        order = Order(
+            id=index + 1,
+            user_id=rng.randint(1, 1000),
+            total_amount=0,
+            status=rng.choice(STATUSES),
+            shipping_address=f'{rng.randint(1, 999)} Main Street, Springfield',
+            created_at=created,
+            updated_at=created
+        )
+        for line in range(rng.randint(1, 4)):
+            product = rng.choice(products)
+            item = OrderItem(id=index * 4 + line, order_id=order.id, product_id=product.id,
+                             quantity=rng.randint(1, 3), price=product.price)
+            item.product = product
+            order.order_items.append(item)
+        orders.append(order)
+    return orders
+
+def measure(payload, level, rounds=5):
+    start = time.process_time()
+    for _ in range(rounds):
+        compressed = gzip.compress(payload, compresslevel=level, mtime=0)
+    cpu = (time.process_time() - start) / rounds
+    return len(compressed), cpu
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--products', type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    products = make_products(args.products, rng)
+    orders = make_orders(args.orders, products, rng)
+    payloads = {
+        '/api/products': json.dumps([product.to_dict() for product in products]).encode(),
+        '/api/admin/orders': json.dumps({'orders': [order.to_dict() for order in orders[:20]],
+                                         'total': len(orders), 'pages': 10, 'current_page': 1}).encode(),
+        '/api/orders (all)': json.dumps([order.to_dict() for order in orders]).encode(),
+    }
+
+    for name, payload in payloads.items():
+        print(f"\n{name}: {len(payload) / 1024:.1f} KB uncompressed")
+        print(f"{'level':>6}{'bytes':>12}{'ratio':>9}{'cpu ms':>10}{'MB/s':>9}")
+        for level in range(1, 10):
+            size, cpu = measure(payload, level)
+            throughput = len(payload) / cpu / 1024 / 1024 if cpu else float('inf')
+            print(f"{level:>6}{size:>12}{len(payload) / size:>8.1f}x{cpu * 1000:>10.2f}{throughput:>9.0f}")
+
+if __name__ == '__main__':
+    main()
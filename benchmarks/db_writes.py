@@ -0,0 +1,95 @@
+"""Concurrent write throughput (cart adds and checkouts) against a scratch SQLite database.
+
+Usage: python benchmarks/db_writes.py [--threads 8] [--writes 200] [--profile tuned|default|both]
+
+`default` is SQLite with a rollback journal and stock pool settings; `tuned`
+is the production profile from src/config.py (WAL, synchronous=NORMAL, ...).
+Set DATABASE_URL to benchmark another database instead of a scratch file.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import tempfile
+import threading
+import time
+from src.config import engine_options
+from src.main import create_app
+from src.commands import init_db, seed_sample_data
+from src.models.user import db, User
+from src.models.product import Product, CartItem, Order, OrderItem
+
+def run(profile, threads, writes):
+    with tempfile.TemporaryDirectory() as directory:
+        uri = os.environ.get('DATABASE_URL') or f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        config = {'SQLALCHEMY_DATABASE_URI': uri}
+        if profile == 'default':
+            config['SQLITE_PRAGMAS'] = {}
+            config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+        else:
+            config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(uri)
+        app = create_app(config)
+
+        with app.app_context():
+            init_db()
+            seed_sample_data()
+            users = []
+            for index in range(threads):
+                user = User(username=f'bench{index}', email=f'bench{index}@example.com', password_hash='x')
+                db.session.add(user)
+                users.append(user)
+            db.session.commit()
+            user_ids = [user.id for user in users]
+            product_ids = [product.id for product in Product.query.all()]
+
+        errors = []
+
+        def worker(user_id):
+            with app.app_context():
+                for index in range(writes):
+                    try:
+                        # Mirrors add_to_cart, with every tenth write a checkout
+                        product_id = product_ids[index % len(product_ids)]
+                        db.session.add(CartItem(user_id=user_id, product_id=product_id, quantity=1))
+                        db.session.commit()
+                        if index % 10 == 9:
+                            order = Order(user_id=user_id, total_amount=10, shipping_address='bench')
+                            db.session.add(order)
+                            db.session.flush()
+                            db.session.add(OrderItem(order_id=order.id, product_id=product_id, quantity=1, price=10))
+                            CartItem.query.filter_by(user_id=user_id).delete()
+                            db.session.commit()
+                    except Exception as e:
+                        db.session.rollback()
+                        errors.append(str(e))
+
+        pool = [threading.Thread(target=worker, args=(user_id,)) for user_id in user_ids]
+        start = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        with app.app_context():
+            db.engine.dispose()
+
+    commits = threads * (writes + writes // 10)
+    print(f"{profile:8} {commits:7d} commits in {elapsed:6.2f}s  {commits / elapsed:8.0f} commits/s  errors: {len(errors)}")
+    if errors:
+        print(f"         first error: {errors[0][:120]}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=200)
+    parser.add_argument('--profile', choices=['tuned', 'default', 'both'], default='both')
+    args = parser.parse_args()
+
+    profiles = ['default', 'tuned'] if args.profile == 'both' else [args.profile]
+    for profile in profiles:
+        run(profile, args.threads, args.writes)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Compare the legacy full-decode resize against the draft/thumbnail variant pipeline.
+
+Usage: python benchmarks/image_variants.py [--count 8] [--size 4032x3024]
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import io
+import time
+from PIL import Image
+from src.utils.images import IMAGE_VARIANTS, create_variants
+
+def make_photo(width, height, seed):
+    """Synthesize a phone-sized JPEG with enough detail to be costly to decode"""
+    noise = Image.effect_noise((width // 8, height // 8), 40 + seed).convert('RGB')
+    gradient = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    image = Image.blend(noise.resize((width, height), Image.Resampling.BICUBIC), gradient, 0.4)
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=92)
+    return output.getvalue()
+
+def legacy_variants(image_data):
+    """The previous approach: full decode, then one LANCZOS resize per rendition"""
+    renditions = {}
+    image = Image.open(io.BytesIO(image_data))
+    image.load()
+    for name, (max_width, max_height) in IMAGE_VARIANTS.items():
+        width, height = image.size
+        ratio = min(max_width / width, max_height / height, 1)
+        resized = image.resize((int(width * ratio), int(height * ratio)), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        resized.save(output, format='JPEG', quality=85, optimize=True)
+        renditions[name] = output.getvalue()
+    return renditions
+
+def timed(fn, corpus):
+    start = time.perf_counter()
+    for image_data in corpus:
+        fn(image_data)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=8)
+    parser.add_argument('--size', default='4032x3024')
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.size.split('x'))
+    corpus = [make_photo(width, height, seed) for seed in range(args.count)]
+    print(f"Corpus: {args.count} JPEGs at {width}x{height}, "
+          f"{sum(len(data) for data in corpus) / 1024 / 1024:.1f} MB total")
+
+    legacy = timed(legacy_variants, corpus)
+    pipeline = timed(create_variants, corpus)
+
+    print(f"{'legacy (full decode + resize)':32} {legacy / args.count * 1000:8.1f} ms/image")
+    print(f"{'pipeline (draft + thumbnail)':32} {pipeline / args.count * 1000:8.1f} ms/image")
+    print(f"{'speedup':32} {legacy / pipeline:8.2f}x")
+
+if __name__ == '__main__':
+    main()
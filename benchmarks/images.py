@@ -0,0 +1,189 @@
+"""Benchmark the upload image pipeline stage by stage and gate on regressions.
+
+Usage:
+    python benchmarks/images.py                           # print results
+    python benchmarks/images.py --output results.json     # also write them as JSON
+    python benchmarks/images.py --baseline baseline.json  # exit 1 on regression
+
+Every corpus image runs in a fresh child process and peak memory is the
+resident high-water mark above that process's starting footprint. Timings
+are the median over --repeat runs.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import io
+import json
+import platform
+import resource
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import PIL
+from PIL import Image
+from src.utils.images import IMAGE_VARIANTS, JPEG_QUALITY, decode_image, flatten_image, resize_to_fit, encode_jpeg
+
+STAGES = ['decode', 'convert', 'resize', 'encode']
+
+# name -> (format, mode, size)
+CORPUS = {
+    'jpeg_small': ('JPEG', 'RGB', (640, 480)),
+    'jpeg_phone': ('JPEG', 'RGB', (4032, 3024)),
+    'jpeg_panorama': ('JPEG', 'RGB', (8000, 2000)),
+    'png_rgba': ('PNG', 'RGBA', (2000, 2000)),
+    'gif_palette': ('GIF', 'P', (800, 600)),
+    'webp_photo': ('WEBP', 'RGB', (3000, 2000)),
+}
+
+def generate_image(image_format, mode, size, seed=0):
+    """Deterministic image with photo-like detail (noise over a gradient)"""
+    width, height = size
+    noise = Image.effect_noise((max(width // 8, 1), max(height // 8, 1)), 40 + seed)
+    gradient = Image.linear_gradient('L').resize(size)
+    red = Image.blend(noise.resize(size, Image.Resampling.BICUBIC), gradient, 0.4)
+    image = Image.merge('RGB', (red, gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    if mode == 'RGBA':
+        image.putalpha(gradient)
+    elif mode == 'P':
+        image = image.quantize(colors=256)
+
+    output = io.BytesIO()
+    options = {'quality': 92} if image_format in ('JPEG', 'WEBP') else {}
+    image.save(output, format=image_format, **options)
+    return output.getvalue()
+
+def build_corpus(directory):
+    paths = {}
+    for name, (image_format, mode, size) in CORPUS.items():
+        path = os.path.join(directory, f"{name}.{image_format.lower()}")
+        with open(path, 'wb') as f:
+            f.write(generate_image(image_format, mode, size))
+        paths[name] = path
+    return paths
+
+def read_status_kb(field):
+    """Read a VmRSS/VmHWM value from /proc; None where /proc is unavailable"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+def reset_peak_rss():
+    """Reset VmHWM so the next reading covers only the code that follows (Linux 4.0+)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return read_status_kb('VmRSS')
+    except OSError:
+        return None
+
+def peak_rss_kb():
+    peak = read_status_kb('VmHWM')
+    return peak if peak is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def run_case(path, repeat):
+    """Time each pipeline stage for one image; runs inside a fresh child process"""
+    baseline_rss = reset_peak_rss() or peak_rss_kb()
+    target = IMAGE_VARIANTS['full']
+    timings = {stage: [] for stage in STAGES}
+    output_bytes = 0
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        image = decode_image(path, target)
+        timings['decode'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        image = flatten_image(image)
+        timings['convert'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        image = resize_to_fit(image, target)
+        timings['resize'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        output_bytes = len(encode_jpeg(image, JPEG_QUALITY))
+        timings['encode'].append(time.perf_counter() - start)
+
+    result = {f'{stage}_ms': round(statistics.median(values) * 1000, 3) for stage, values in timings.items()}
+    result['total_ms'] = round(sum(result[f'{stage}_ms'] for stage in STAGES), 3)
+    result['input_bytes'] = os.path.getsize(path)
+    result['output_bytes'] = output_bytes
+    # Peak resident memory above what the process was already using
+    result['peak_mem_mb'] = round((peak_rss_kb() - baseline_rss) / 1024, 2)
+    return result
+
+def run_benchmarks(repeat):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, path in build_corpus(directory).items():
+            # One task per child keeps peak RSS attributable to a single case
+            with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+                results[name] = executor.submit(run_case, path, repeat).result()
+    return results
+
+def compare(results, baseline, tolerance):
+    """Return regressions where time, output size or memory grew beyond tolerance"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        for metric in ('total_ms', 'output_bytes', 'peak_mem_mb'):
+            # Ignore noise on tiny values (sub-millisecond stages, near-zero memory)
+            if previous[metric] < 1:
+                continue
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name}.{metric}: {previous[metric]} -> {current[metric]}")
+    return regressions
+
+def print_table(results):
+    header = f"{'case':16}" + ''.join(f"{column:>11}" for column in STAGES + ['total', 'out KB', 'peak MB'])
+    print(header)
+    print('-' * len(header))
+    for name, result in results.items():
+        row = [result[f'{stage}_ms'] for stage in STAGES] + [result['total_ms'], result['output_bytes'] / 1024, result['peak_mem_mb']]
+        print(f"{name:16}" + ''.join(f"{value:>11.1f}" for value in row))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='Write machine-readable results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against a previous --output file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown/growth (default 0.2)')
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+        },
+        'results': run_benchmarks(args.repeat),
+    }
+    print_table(report['results'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report['results'], json.load(f), args.tolerance)
+        if regressions:
+            print('\nRegressions beyond tolerance:')
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print('\nNo regressions against baseline.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,459 @@
+"""Drive mixed HTTP traffic at a local instance and report latency per endpoint.
+
+Usage:
+    python benchmarks/loadtest.py                              # start src.server on a scratch DB, run 30s
+    python benchmarks/loadtest.py --users 64 --workers 4 --duration 60
+    python benchmarks/loadtest.py --output after.json --baseline before.json   # exit 1 on regression
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000 # existing instance
+
+Each simulated user is a thread with its own keep-alive connection and
+session cookie. Shoppers log in, browse, add to and update their cart,
+check out and list orders; a share of users are admins paging through the
+admin listings. The action mix is drawn from a seeded RNG, so two runs with
+the same arguments send the same sequence of requests per user. Requests in
+the first --warmup seconds are not counted. A GET that finds its keep-alive
+connection already closed by the server is resent once on a new connection;
+the report counts these retries separately from errors.
+
+Against --url, shoppers are registered over HTTP first (existing accounts are
+reused) and admin users all log in as `admin` with --admin-password.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import gzip
+import http.client
+import json
+import platform
+import random
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOAD_PASSWORD = 'Load1234!'
+ADMIN_PASSWORD = 'Admin123!'
+
+# action -> relative weight
+SHOPPER_MIX = {
+    'browse_products': 25,
+    'browse_categories': 10,
+    'view_product': 20,
+    'add_to_cart': 15,
+    'update_cart': 6,
+    'view_cart': 10,
+    'checkout': 4,
+    'list_orders': 6,
+    'login': 4,
+}
+ADMIN_MIX = {
+    'admin_orders': 30,
+    'admin_users': 20,
+    'admin_dashboard': 20,
+    'browse_products': 30,
+}
+
+# Only these are retried, and only when they cannot have reached the server
+RETRY_METHODS = ('GET', 'HEAD')
+
+class Client:
+    """One simulated user: a keep-alive connection and its own cookies"""
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.connection = None
+        self.cookies = {}
+        self.retries = 0
+
+    def request(self, method, path, body=None):
+        headers = {'Accept': 'application/json', 'Accept-Encoding': 'gzip'}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+
+        reused = self.connection is not None
+        if not reused:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        sent = False
+        try:
+            self.connection.request(method, path, body=data, headers=headers)
+            sent = True
+            response = self.connection.getresponse()
+            payload = response.read()
+        except (http.client.HTTPException, OSError) as e:
+            self.close()
+            # The server closed an idle keep-alive connection (e.g. a recycled worker) before
+            # reading this request: no response byte came back. Timeouts, truncated bodies and
+            # anything after a non-idempotent request went out are real failures.
+            stale = isinstance(e, http.client.RemoteDisconnected) or (
+                not sent and isinstance(e, (BrokenPipeError, ConnectionResetError))
+            )
+            if not (reused and stale and method in RETRY_METHODS):
+                raise
+            self.retries += 1
+            return self.request(method, path, body)
+
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        if response.getheader('Connection', '').lower() == 'close':
+            self.close()
+        if response.getheader('Content-Encoding') == 'gzip':
+            payload = gzip.decompress(payload)
+
+        try:
+            parsed = json.loads(payload) if payload else None
+        except ValueError:
+            parsed = None
+        return response.status, parsed
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+class SimulatedUser(threading.Thread):
+    def __init__(self, client, username, password, mix, product_ids, rng, warmup_end, deadline, think):
+        super().__init__(daemon=True)
+        self.client = client
+        self.username = username
+        self.password = password
+        self.mix = mix
+        self.product_ids = product_ids
+        self.rng = rng
+        self.warmup_end = warmup_end
+        self.deadline = deadline
+        self.think = think
+        self.cart_item_ids = []
+        self.samples = {}  # endpoint -> [latency seconds]
+        self.errors = {}  # endpoint -> count
+        self.retries = {}  # endpoint -> requests resent on a fresh connection
+        self.first_errors = {}  # endpoint -> first failure, for the report
+
+    def call(self, endpoint, method, path, body=None, expected=(200, 201)):
+        start = time.perf_counter()
+        retries = self.client.retries
+        try:
+            status, payload = self.client.request(method, path, body)
+            failure = None if status in expected else f'HTTP {status}: {payload}'
+        except Exception as e:
+            status, payload, failure = None, None, f'{type(e).__name__}: {e}'
+        elapsed = time.perf_counter() - start
+
+        if time.monotonic() >= self.warmup_end:
+            self.samples.setdefault(endpoint, []).append(elapsed)
+            if self.client.retries > retries:
+                self.retries[endpoint] = self.retries.get(endpoint, 0) + self.client.retries - retries
+            if failure:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+                self.first_errors.setdefault(endpoint, failure[:200])
+        return status, payload
+
+    def login(self):
+        self.call('POST /api/auth/login', 'POST', '/api/auth/login', {'username': self.username, 'password': self.password})
+
+    def act(self, action):
+        if action == 'browse_products':
+            self.call('GET /api/products', 'GET', '/api/products')
+        elif action == 'browse_categories':
+            self.call('GET /api/categories', 'GET', '/api/categories')
+        elif action == 'view_product':
+            self.call('GET /api/products/<id>', 'GET', f'/api/products/{self.rng.choice(self.product_ids)}')
+        elif action == 'add_to_cart' or (action in ('update_cart', 'checkout') and not self.cart_item_ids):
+            body = {'product_id': self.rng.choice(self.product_ids), 'quantity': self.rng.randint(1, 3)}
+            status, payload = self.call('POST /api/cart', 'POST', '/api/cart', body)
+            if status == 201 and payload and payload.get('id') not in self.cart_item_ids:
+                self.cart_item_ids.append(payload['id'])
+        elif action == 'update_cart':
+            item_id = self.rng.choice(self.cart_item_ids)
+            self.call('PUT /api/cart/<id>', 'PUT', f'/api/cart/{item_id}', {'quantity': self.rng.randint(1, 5)})
+        elif action == 'view_cart':
+            self.call('GET /api/cart', 'GET', '/api/cart')
+        elif action == 'checkout':
+            status, _ = self.call('POST /api/checkout', 'POST', '/api/checkout', {'shipping_address': '1 Load Test Lane'})
+            if status == 201:
+                self.cart_item_ids = []
+        elif action == 'list_orders':
+            self.call('GET /api/orders', 'GET', '/api/orders')
+        elif action == 'login':
+            self.login()
+        elif action == 'admin_orders':
+            self.call('GET /api/admin/orders', 'GET', f'/api/admin/orders?page={self.rng.randint(1, 5)}')
+        elif action == 'admin_users':
+            self.call('GET /api/admin/users', 'GET', f'/api/admin/users?page={self.rng.randint(1, 5)}')
+        elif action == 'admin_dashboard':
+            self.call('GET /api/admin/dashboard', 'GET', '/api/admin/dashboard')
+
+    def run(self):
+        actions = list(self.mix)
+        weights = list(self.mix.values())
+        self.login()
+        while time.monotonic() < self.deadline:
+            self.act(self.rng.choices(actions, weights)[0])
+            if self.think:
+                time.sleep(self.rng.expovariate(1 / self.think))
+        self.client.close()
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(users, measured_seconds):
+    samples, errors, retries, first_errors = {}, {}, {}, {}
+    for user in users:
+        for endpoint, values in user.samples.items():
+            samples.setdefault(endpoint, []).extend(values)
+        for endpoint, count in user.errors.items():
+            errors[endpoint] = errors.get(endpoint, 0) + count
+        for endpoint, count in user.retries.items():
+            retries[endpoint] = retries.get(endpoint, 0) + count
+        for endpoint, failure in user.first_errors.items():
+            first_errors.setdefault(endpoint, failure)
+
+    all_values = [value for values in samples.values() for value in values]
+    samples['TOTAL'] = all_values
+    errors['TOTAL'] = sum(errors.values())
+    retries['TOTAL'] = sum(retries.values())
+
+    results = {}
+    for endpoint, values in sorted(samples.items()):
+        values.sort()
+        count = len(values)
+        results[endpoint] = {
+            'requests': count,
+            'rps': round(count / measured_seconds, 2),
+            'error_rate': round(errors.get(endpoint, 0) / count, 4) if count else 0.0,
+            'retries': retries.get(endpoint, 0),
+            'mean_ms': round(sum(values) / count * 1000, 2) if count else 0.0,
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2) if values else 0.0,
+        }
+        if endpoint in first_errors:
+            results[endpoint]['first_error'] = first_errors[endpoint]
+    return results
+
+def compare(results, baseline, tolerance, min_requests=50):
+    """Regressions: tail latency or error rate up, or throughput down, beyond tolerance"""
+    regressions = []
+    for endpoint, current in results.items():
+        previous = baseline.get('results', {}).get(endpoint)
+        if not previous or min(previous['requests'], current['requests']) < min_requests:
+            continue  # Too few samples for a p99 to mean anything
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if previous[metric] >= 1 and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{endpoint} {metric}: {previous[metric]} -> {current[metric]}")
+        if current['rps'] < previous['rps'] * (1 - tolerance):
+            regressions.append(f"{endpoint} rps: {previous['rps']} -> {current['rps']}")
+        if current['error_rate'] > previous['error_rate'] + 0.01:
+            regressions.append(f"{endpoint} error_rate: {previous['error_rate']} -> {current['error_rate']}")
+    return regressions
+
+def print_table(results):
+    header = f"{'endpoint':28}{'requests':>9}{'rps':>9}{'err %':>7}{'retry':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    print(header)
+    print('-' * len(header))
+    for endpoint, result in results.items():
+        if endpoint == 'TOTAL':
+            print('-' * len(header))
+        print(
+            f"{endpoint:28}{result['requests']:>9}{result['rps']:>9.1f}{result['error_rate'] * 100:>7.2f}{result.get('retries', 0):>7}"
+            f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['max_ms']:>9.1f}"
+        )
+    for endpoint, result in results.items():
+        if 'first_error' in result:
+            print(f"  first error on {endpoint}: {result['first_error']}")
+
+def prepare_database(uri, shoppers, admins, products):
+    """Scratch database: sample data plus load users and well-stocked products"""
+    from werkzeug.security import generate_password_hash
+    from src.main import create_app
+    from src.commands import init_db, seed_sample_data
+    from src.models.user import db, User
+    from src.models.product import Product
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'SLOW_QUERY_LOG': ''})
+    with app.app_context():
+        init_db()
+        seed_sample_data()
+        # Hash once; every load user shares the password
+        password_hash = generate_password_hash(LOAD_PASSWORD)
+        for index in range(shoppers):
+            db.session.add(User(username=f'load{index}', email=f'load{index}@example.com', password_hash=password_hash))
+        for index in range(admins):
+            db.session.add(User(
+                username=f'loadadmin{index}', email=f'loadadmin{index}@example.com',
+                password_hash=password_hash, is_admin=True
+            ))
+        for index in range(products):
+            db.session.add(Product(
+                name=f'Load product {index}', description='Load test product', price=5 + index % 50,
+                category=f'load{index % 8}', stock_quantity=10 ** 7
+            ))
+        db.session.commit()
+        product_ids = [product.id for product in Product.query.filter(Product.name.like('Load product %')).all()]
+        db.engine.dispose()
+    return product_ids
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(uri, port, workers):
+    env = dict(os.environ, DATABASE_URL=uri, SLOW_QUERY_LOG='')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'src.server', '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'server exited: {server.stderr.read().decode()[-2000:]}')
+        try:
+            status, _ = Client('127.0.0.1', port, 2).request('GET', '/api/categories')
+            if status == 200:
+                return server
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError('server did not start within 30s')
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=40)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+def prepare_remote(host, port, shoppers, timeout):
+    """Register the load shoppers on a running instance; returns the active product ids"""
+    for index in range(shoppers):
+        client = Client(host, port, timeout)
+        status, payload = client.request('POST', '/api/auth/register', {
+            'username': f'load{index}', 'email': f'load{index}@example.com', 'password': LOAD_PASSWORD,
+        })
+        client.close()
+        if status not in (201, 409):
+            raise RuntimeError(f'could not register load{index}: HTTP {status} {payload}')
+
+    client = Client(host, port, timeout)
+    status, products = client.request('GET', '/api/products')
+    client.close()
+    if status != 200 or not products:
+        raise RuntimeError(f'no products to order from: HTTP {status}')
+    return [product['id'] for product in products]
+
+def run_load(host, port, args, product_ids):
+    admins = int(round(args.users * args.admin_share))
+    start = time.monotonic()
+    warmup_end = start + args.warmup
+    deadline = warmup_end + args.duration
+
+    users = []
+    for index in range(args.users):
+        rng = random.Random(f'{args.seed}-{index}')
+        if index < admins and args.url:
+            username, password, mix = 'admin', args.admin_password, ADMIN_MIX
+        elif index < admins:
+            username, password, mix = f'loadadmin{index}', LOAD_PASSWORD, ADMIN_MIX
+        else:
+            username, password, mix = f'load{index - admins}', LOAD_PASSWORD, SHOPPER_MIX
+        client = Client(host, port, args.timeout)
+        users.append(SimulatedUser(client, username, password, mix, product_ids, rng, warmup_end, deadline, args.think))
+
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    return summarize(users, args.duration)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='Target a running instance instead of starting one')
+    parser.add_argument('--workers', type=int, default=2, help='src.server worker processes when starting one')
+    parser.add_argument('--users', type=int, default=32, help='Concurrent simulated users')
+    parser.add_argument('--admin-share', type=float, default=0.1, help='Fraction of users that are admins')
+    parser.add_argument('--admin-password', default=ADMIN_PASSWORD, help='Password of `admin` on a --url target')
+    parser.add_argument('--duration', type=float, default=30, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=3, help='Seconds of traffic before measuring')
+    parser.add_argument('--think', type=float, default=0, help='Mean pause between a user\'s requests, in seconds')
+    parser.add_argument('--products', type=int, default=50, help='Products added to the scratch database')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', default='loadtest')
+    parser.add_argument('--output', help='Write machine-readable results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against a previous --output file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression (default 0.2)')
+    args = parser.parse_args()
+
+    admins = int(round(args.users * args.admin_share))
+    with tempfile.TemporaryDirectory() as directory:
+        server = None
+        if args.url:
+            target = urlsplit(args.url)
+            host, port = target.hostname, target.port or 80
+            product_ids = prepare_remote(host, port, args.users - admins, args.timeout)
+        else:
+            uri = f"sqlite:///{os.path.join(directory, 'loadtest.db')}"
+            product_ids = prepare_database(uri, args.users - admins, admins, args.products)
+            host, port = '127.0.0.1', free_port()
+            server = start_server(uri, port, args.workers)
+
+        try:
+            results = run_load(host, port, args, product_ids)
+        finally:
+            if server is not None:
+                stop_server(server)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'target': args.url or f'src.server --workers {args.workers}',
+            'users': args.users,
+            'admin_share': args.admin_share,
+            'duration': args.duration,
+            'think': args.think,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    print_table(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('users') != args.users:
+            print('\nWarning: baseline used a different number of users; numbers are not comparable.')
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('\nRegressions beyond tolerance:')
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print('\nNo regressions against baseline.')
+
+if __name__ == '__main__':
+    main()
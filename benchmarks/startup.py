@@ -0,0 +1,54 @@
+"""Measure worker cold start: interpreter + import + app creation + first request.
+
+Usage: python benchmarks/startup.py [--runs 10]
+
+Each run is a fresh interpreter, which is what a newly booted worker pays.
+The database must already exist (flask --app src.main init-db).
+"""
+import os
+import sys
+import argparse
+import json
+import statistics
+import subprocess
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import src.main as main
+imported = time.perf_counter()
+app = main.create_app() if hasattr(main, 'create_app') else main.app
+created = time.perf_counter()
+response = app.test_client().get('/api/products')
+assert response.status_code == 200, response.status_code
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+}))
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    samples = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, check=True,
+                                capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result['process_ms'] = (time.perf_counter() - start) * 1000
+        samples.append(result)
+
+    for metric in ('import_ms', 'create_app_ms', 'first_request_ms', 'process_ms'):
+        values = [sample[metric] for sample in samples]
+        print(f"{metric:18} median {statistics.median(values):8.1f}  min {min(values):8.1f}  max {max(values):8.1f}")
+
+if __name__ == '__main__':
+    main()
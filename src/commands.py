@@ -0,0 +1,256 @@
+from flask import current_app
+from flask.cli import with_appcontext
+from src.models.user import db, User
+import click
+import os
+
+SAMPLE_PRODUCTS = [
+    {
+        'name': 'Custom Pet T-Shirt',
+        'description': 'High-quality cotton t-shirt with your pet\'s custom portrait',
+        'price': 29.99,
+        'category': 'apparel',
+        'image_url': '/assets/sample-tshirt.jpg',
+        'stock_quantity': 100,
+        'is_featured': True
+    },
+    {
+        'name': 'Pet Portrait Mug',
+        'description': 'Ceramic mug featuring your pet\'s beautiful portrait',
+        'price': 19.99,
+        'category': 'drinkware',
+        'image_url': '/assets/sample-mug.jpg',
+        'stock_quantity': 50,
+        'is_featured': True
+    },
+    {
+        'name': 'Canvas Pet Print',
+        'description': 'Premium canvas print of your pet in artistic style',
+        'price': 49.99,
+        'category': 'prints',
+        'image_url': '/assets/sample-canvas.jpg',
+        'stock_quantity': 25,
+        'is_featured': True
+    },
+    {
+        'name': 'Pet Phone Case',
+        'description': 'Protective phone case with your pet\'s photo',
+        'price': 24.99,
+        'category': 'accessories',
+        'image_url': '/assets/sample-phonecase.jpg',
+        'stock_quantity': 75,
+        'is_featured': False
+    },
+    {
+        'name': 'Pet Pillow',
+        'description': 'Soft pillow featuring your beloved pet',
+        'price': 34.99,
+        'category': 'home',
+        'image_url': '/assets/sample-pillow.jpg',
+        'stock_quantity': 30,
+        'is_featured': False
+    }
+]
+
+def init_db():
+    """Create any missing tables (and the SQLite database directory)"""
+    # Import every model so its table is registered on the metadata
+    import src.models.product  # noqa: F401
+    import src.models.upload  # noqa: F401
+
+    uri = current_app.config['SQLALCHEMY_DATABASE_URI']
+    if uri.startswith('sqlite:///') and ':memory:' not in uri:
+        os.makedirs(os.path.dirname(os.path.abspath(uri[len('sqlite:///'):])), exist_ok=True)
+    # Every table lives on the primary; the replica bind only ever reads them
+    db.create_all(bind_key=None)
+    upgrade_existing_tables()
+    number_unsequenced_products()
+
+def upgrade_existing_tables():
+    """Add model columns and indexes that existing tables predate (create_all never alters a table)"""
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(db.engine.dialect)}'
+            # Existing rows take the scalar default, which NOT NULL requires
+            if column.default is not None and column.default.is_scalar:
+                ddl += f' DEFAULT {column.default.arg!r}'
+                if not column.nullable:
+                    ddl += ' NOT NULL'
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql(ddl)
+            click.echo(f'Added column {table.name}.{column.name}')
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(db.engine)
+                click.echo(f'Added index {index.name}')
+
+def number_unsequenced_products():
+    """Give products that predate the change feed a change_seq, in id order"""
+    from src.models.product import Product, next_change_seq
+
+    products = Product.__table__
+    with db.engine.begin() as connection:
+        ids = connection.execute(
+            db.select(products.c.id).where(products.c.change_seq.is_(None)).order_by(products.c.id)
+        ).scalars().all()
+        if not ids:
+            return
+        first = next_change_seq(connection, len(ids)) - len(ids) + 1
+        connection.execute(
+            products.update().where(products.c.id == db.bindparam('product_id')).values(change_seq=db.bindparam('seq')),
+            [{'product_id': product_id, 'seq': first + offset} for offset, product_id in enumerate(ids)]
+        )
+
+def backfill_order_snapshots(batch_size=5000, echo=click.echo):
+    """Copy product name/category/image onto order lines that predate snapshots, in both order tiers.
+
+    The purchase-time values are gone, so lines get the product as it is now.
+    Batches walk the primary key, one transaction each.
+    """
+    from src.models.product import Product, OrderItem, ArchivedOrderItem
+
+    products = Product.__table__
+    filled = 0
+    for items in (OrderItem.__table__, ArchivedOrderItem.__table__):
+        def product_column(column):
+            return db.select(column).where(products.c.id == items.c.product_id).scalar_subquery()
+
+        with db.engine.connect() as connection:
+            last_id = connection.execute(db.select(db.func.max(items.c.id))).scalar() or 0
+            connection.rollback()
+            for first_id in range(1, last_id + 1, batch_size):
+                with connection.begin():
+                    filled += connection.execute(
+                        items.update().where(
+                            items.c.id.between(first_id, first_id + batch_size - 1),
+                            items.c.product_name.is_(None)
+                        ).values(
+                            product_name=product_column(products.c.name),
+                            product_category=product_column(products.c.category),
+                            product_image_url=product_column(products.c.image_url)
+                        )
+                    ).rowcount
+                echo(f'{items.name}: up to id {min(first_id + batch_size - 1, last_id)}, {filled} lines filled')
+    return filled
+
+def seed_sample_data():
+    """Create the admin user and sample products if they don't exist yet"""
+    from src.models.product import Product
+
+    # Create admin user if not exists
+    admin = User.query.filter_by(username='admin').first()
+    if not admin:
+        admin = User(
+            username='admin',
+            email='admin@petnicstudio.com',
+            first_name='Admin',
+            last_name='User',
+            is_admin=True
+        )
+        admin.set_password('Admin123!')
+        db.session.add(admin)
+
+    # Add sample products if none exist
+    if Product.query.count() == 0:
+        for product_data in SAMPLE_PRODUCTS:
+            db.session.add(Product(**product_data))
+
+    db.session.commit()
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create database tables."""
+    init_db()
+    click.echo('Database initialized.')
+
+@click.command('seed')
+@with_appcontext
+def seed_command():
+    """Add the admin user and sample products."""
+    seed_sample_data()
+    click.echo('Sample data added.')
+
+@click.command('generate-data')
+@click.option('--users', default=10000, show_default=True)
+@click.option('--products', default=1000, show_default=True)
+@click.option('--orders', default=100000, show_default=True)
+@click.option('--max-items', default=5, show_default=True, help='Lines per order (and cart), 1 to this many')
+@click.option('--carts', default=1000, show_default=True, help='Users given a cart')
+@click.option('--days', default=365, show_default=True, help='History the orders are spread over')
+@click.option('--seed', default=42, show_default=True)
+@click.option('--batch-size', default=10000, show_default=True, help='Rows per executemany')
+@with_appcontext
+def generate_data_command(users, products, orders, max_items, carts, days, seed, batch_size):
+    """Bulk-insert deterministic users, products, orders and carts."""
+    from src.datagen import generate_data, GENERATED_PASSWORD
+    init_db()
+    generate_data(
+        users, products, orders, max_items, carts,
+        seed=seed, days=days, batch_size=batch_size, echo=click.echo
+    )
+    click.echo(f'Generated users log in with password {GENERATED_PASSWORD}.')
+
+@click.command('check-query-budgets')
+def check_query_budgets_command():
+    """Fail if any route runs more SQL statements than its budget."""
+    from src.query_budgets import check_query_budgets
+    failures = check_query_budgets(echo=click.echo)
+    if failures:
+        raise click.ClickException(f'{failures} route(s) failed their query budget')
+    click.echo('All routes within their query budgets.')
+
+@click.command('archive-orders')
+@click.option('--days', type=int, default=None, help='Archive final orders untouched this long [ORDER_ARCHIVE_DAYS]')
+@click.option('--batch-size', type=int, default=None, help='Orders moved per transaction [ORDER_ARCHIVE_BATCH]')
+@with_appcontext
+def archive_orders_command(days, batch_size):
+    """Move old delivered and cancelled orders into the archive tables."""
+    from src.utils.archive import archive_orders
+    days = current_app.config['ORDER_ARCHIVE_DAYS'] if days is None else days
+    batch_size = batch_size or current_app.config['ORDER_ARCHIVE_BATCH']
+    moved = archive_orders(days, batch_size, echo=click.echo)
+    click.echo(f'Archived {moved} order(s) older than {days} days.')
+
+@click.command('backfill-order-snapshots')
+@click.option('--batch-size', default=5000, show_default=True, help='Order lines updated per transaction')
+@with_appcontext
+def backfill_order_snapshots_command(batch_size):
+    """Store product snapshots on order lines created before checkout recorded them."""
+    filled = backfill_order_snapshots(batch_size)
+    click.echo(f'Filled product snapshots on {filled} order line(s).')
+
+@click.command('sweep-reservations')
+@with_appcontext
+def sweep_reservations_command():
+    """Delete expired cart stock reservations."""
+    from src.utils.reservations import sweep_expired_reservations
+    click.echo(f'Removed {sweep_expired_reservations()} expired reservation(s).')
+
+@click.command('check-optimistic-locking')
+@click.option('--writers', default=16, show_default=True, help='Concurrent clients per round')
+@click.option('--rounds', default=3, show_default=True, help='Rounds per scenario')
+def check_optimistic_locking_command(writers, rounds):
+    """Fail unless concurrent edits land exactly once per version."""
+    from src.locking_check import check_optimistic_locking
+    failures = check_optimistic_locking(writers, rounds, echo=click.echo)
+    if failures:
+        raise click.ClickException(f'{failures} check(s) failed')
+    click.echo('Optimistic locking holds under concurrent writers.')
+
+def register_commands(app):
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(generate_data_command)
+    app.cli.add_command(check_query_budgets_command)
+    app.cli.add_command(check_optimistic_locking_command)
+    app.cli.add_command(archive_orders_command)
+    app.cli.add_command(backfill_order_snapshots_command)
+    app.cli.add_command(sweep_reservations_command)
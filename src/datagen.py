@@ -0,0 +1,220 @@
+"""Deterministic bulk data for benchmarking, used by `flask generate-data`.
+
+Rows are built in Python with explicit primary keys (continuing after the
+highest existing id) and written with Core executemany inserts, many
+batches per transaction, so millions of rows go in without the ORM's
+per-object bookkeeping. The same seed and volumes always produce the same
+rows.
+"""
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from src.models.user import db, User
+import random
+import time
+
+CATEGORIES = ['apparel', 'drinkware', 'prints', 'accessories', 'home', 'stationery', 'toys', 'jewelry']
+ORDER_STATUSES = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
+ORDER_STATUS_WEIGHTS = [5, 5, 10, 75, 5]  # Most of a mature shop's history is delivered
+GENERATED_PASSWORD = 'Password123!'
+
+def next_id(connection, table):
+    return (connection.execute(db.select(db.func.max(table.c.id))).scalar() or 0) + 1
+
+class BulkWriter:
+    """Buffers rows per table and executes them as one executemany per batch"""
+
+    def __init__(self, connection, batch_size):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.pending = {}  # table -> [row dicts]
+        self.written = {}  # table name -> rows written
+
+    def add(self, table, row):
+        rows = self.pending.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self, table=None):
+        # Tables go out in the order they were first added, so parents precede children
+        tables = [table] if table is not None else list(self.pending)
+        for current in tables:
+            rows = self.pending.get(current)
+            if rows:
+                self.connection.execute(current.insert(), rows)
+                self.written[current.name] = self.written.get(current.name, 0) + len(rows)
+                self.pending[current] = []
+
+def generate_data(users, products, orders, max_items, carts, seed=42, days=365, batch_size=10000,
+                  transaction_rows=500000, echo=print):
+    """Insert the requested volumes; returns {table name: rows written}"""
+    from src.models.product import Product, CartItem, Order, OrderItem, next_change_seq
+
+    rng = random.Random(seed)
+    # One hash for every generated user: hashing is deliberately slow (~0.1s each)
+    password_hash = generate_password_hash(GENERATED_PASSWORD)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=days)
+    span_seconds = days * 86400
+
+    users_table = User.__table__
+    products_table = Product.__table__
+    orders_table = Order.__table__
+    items_table = OrderItem.__table__
+    cart_table = CartItem.__table__
+
+    started = time.perf_counter()
+    connection = db.engine.connect()
+    try:
+        transaction = connection.begin()
+        first_user = next_id(connection, users_table)
+        first_product = next_id(connection, products_table)
+        first_order = next_id(connection, orders_table)
+        first_item = next_id(connection, items_table)
+        first_cart_item = next_id(connection, cart_table)
+
+        # Generated products join the change feed in id order
+        first_change_seq = next_change_seq(connection, products) - products + 1
+
+        writer = BulkWriter(connection, batch_size)
+        rows_in_transaction = 0
+
+        def row_written():
+            # Large transactions amortise the commit cost; bounded so the journal stays sane
+            nonlocal transaction, rows_in_transaction
+            rows_in_transaction += 1
+            if rows_in_transaction >= transaction_rows:
+                writer.flush()
+                transaction.commit()
+                transaction = connection.begin()
+                rows_in_transaction = 0
+
+        for offset in range(users):
+            user_id = first_user + offset
+            created_at = start + timedelta(seconds=rng.randrange(span_seconds))
+            writer.add(users_table, {
+                'id': user_id,
+                'username': f'user{user_id}',
+                'email': f'user{user_id}@example.com',
+                'password_hash': password_hash,
+                'first_name': f'First{user_id % 997}',
+                'last_name': f'Last{user_id % 1009}',
+                'phone': f'555-{user_id % 10000:04d}',
+                'address': f'{user_id % 9999 + 1} Generated Street',
+                'is_admin': False,
+                'is_active': rng.random() > 0.02,
+                'created_at': created_at,
+                'updated_at': created_at,
+            })
+            row_written()
+        writer.flush(users_table)
+        echo(f'users: {users} rows')
+
+        for offset in range(products):
+            product_id = first_product + offset
+            category = CATEGORIES[offset % len(CATEGORIES)]
+            price = round(rng.uniform(5, 150), 2)
+            created_at = start + timedelta(seconds=rng.randrange(span_seconds))
+            writer.add(products_table, {
+                'id': product_id,
+                'name': f'{category.title()} item {product_id}',
+                'description': f'Generated {category} product number {product_id}',
+                'price': price,
+                'category': category,
+                'image_url': f'/assets/generated-{product_id % 50}.jpg',
+                'stock_quantity': rng.randint(0, 1000),
+                'is_featured': rng.random() < 0.05,
+                'is_active': rng.random() > 0.05,
+                'change_seq': first_change_seq + offset,
+                'created_at': created_at,
+                'updated_at': created_at,
+            })
+            row_written()
+        writer.flush(products_table)
+        echo(f'products: {products} rows')
+
+        # Orders and carts may also reference users and products that existed before
+        user_ids = connection.execute(db.select(users_table.c.id)).scalars().all()
+        catalog = {
+            row.id: row for row in connection.execute(db.select(
+                products_table.c.id, products_table.c.price, products_table.c.name,
+                products_table.c.category, products_table.c.image_url
+            ))
+        }
+        product_ids = list(catalog)
+        if orders and not (user_ids and product_ids):
+            raise ValueError('orders need at least one user and one product')
+
+        item_id = first_item
+        for offset in range(orders):
+            order_id = first_order + offset
+            # Spread orders evenly over the period, so ids and created_at rise together
+            created_at = start + timedelta(seconds=span_seconds * offset // max(orders, 1))
+            total = 0.0
+            items = []
+            for product_id in rng.sample(product_ids, min(rng.randint(1, max_items), len(product_ids))):
+                quantity = rng.randint(1, 3)
+                product = catalog[product_id]
+                total += product.price * quantity
+                items.append({
+                    'id': item_id,
+                    'order_id': order_id,
+                    'product_id': product_id,
+                    'quantity': quantity,
+                    'price': product.price,
+                    'custom_image_url': None,
+                    'custom_text': None,
+                    'product_name': product.name,
+                    'product_category': product.category,
+                    'product_image_url': product.image_url,
+                })
+                item_id += 1
+            status = rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0]
+            writer.add(orders_table, {
+                'id': order_id,
+                'user_id': rng.choice(user_ids),
+                'total_amount': round(total, 2),
+                'status': status,
+                'shipping_address': f'{order_id % 9999 + 1} Generated Street',
+                'created_at': created_at,
+                'updated_at': created_at if status == 'pending' else created_at + timedelta(days=rng.randint(1, 10)),
+            })
+            row_written()
+            for item in items:
+                writer.add(items_table, item)
+                row_written()
+            if (offset + 1) % (batch_size * 10) == 0:
+                echo(f'orders: {offset + 1}/{orders}')
+        writer.flush()
+        echo(f'orders: {orders} rows, order items: {item_id - first_item} rows')
+
+        cart_item_id = first_cart_item
+        for user_id in rng.sample(user_ids, min(carts, len(user_ids))):
+            for product_id in rng.sample(product_ids, min(rng.randint(1, max_items), len(product_ids))):
+                writer.add(cart_table, {
+                    'id': cart_item_id,
+                    'user_id': user_id,
+                    'product_id': product_id,
+                    'quantity': rng.randint(1, 3),
+                    'custom_image_url': None,
+                    'custom_text': None,
+                    'created_at': now - timedelta(seconds=rng.randrange(7 * 86400)),
+                })
+                cart_item_id += 1
+                row_written()
+        writer.flush()
+        echo(f'cart items: {cart_item_id - first_cart_item} rows')
+
+        transaction.commit()
+
+        # Fresh statistics so the planner knows the tables are no longer tiny
+        if connection.dialect.name in ('sqlite', 'postgresql'):
+            connection.exec_driver_sql('ANALYZE')
+        connection.commit()
+    finally:
+        connection.close()
+
+    elapsed = time.perf_counter() - started
+    total_rows = sum(writer.written.values())
+    echo(f'{total_rows} rows in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):.0f} rows/s)')
+    return writer.written
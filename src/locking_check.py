@@ -0,0 +1,136 @@
+"""Concurrency check for optimistic locking, run with `flask check-optimistic-locking`.
+
+Many admin clients PUT the same product (and the same order) at the same
+moment, all claiming to have read the current version. Exactly one write
+may land per version; every other writer must get 409, whether it lost at
+the If-Match check or at the versioned UPDATE. A final round sends no
+precondition at all and checks that no update is lost: every 200 must
+correspond to exactly one version bump.
+
+The database is a temporary SQLite file, so the writers really do race
+through separate connections.
+"""
+from werkzeug.security import generate_password_hash
+from src.models.user import db, User
+import os
+import tempfile
+import threading
+
+PASSWORD = 'Locking123!'
+ORDER_STATUSES = ['processing', 'shipped', 'delivered', 'cancelled']
+
+def race(clients, make_request):
+    """Fire make_request(index, client) from every client at once; returns the status codes"""
+    barrier = threading.Barrier(len(clients))
+    statuses = [None] * len(clients)
+
+    def run(index, client):
+        barrier.wait()
+        statuses[index] = make_request(index, client).status_code
+
+    threads = [threading.Thread(target=run, args=(index, client)) for index, client in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+def check_optimistic_locking(writers=16, rounds=3, echo=print):
+    """Race `writers` clients over `rounds` rounds per route; returns the number of failed rounds"""
+    from src.main import create_app
+    from src.commands import init_db
+    from src.models.product import Product, Order
+
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'SQLALCHEMY_BINDS': {},
+        'SLOW_QUERY_LOG': '',
+        'RESERVATION_SWEEP_SECONDS': 0,
+    })
+    try:
+        with app.app_context():
+            init_db()
+            # A cheap hash: this checks locking, not password hashing
+            admin = User(
+                username='admin', email='admin@example.com', is_admin=True,
+                password_hash=generate_password_hash(PASSWORD, method='pbkdf2:sha256:1')
+            )
+            product = Product(name='Contended', price=1000, category='check', stock_quantity=10)
+            db.session.add_all([admin, product])
+            db.session.flush()
+            order = Order(user_id=admin.id, total_amount=10, shipping_address='1 Check Street', status='pending')
+            db.session.add(order)
+            db.session.commit()
+            product_id, order_id = product.id, order.id
+
+        clients = []
+        for _ in range(writers):
+            client = app.test_client()
+            client.post('/api/auth/login', json={'username': 'admin', 'password': PASSWORD})
+            clients.append(client)
+
+        def current_version(model, row_id):
+            with app.app_context():
+                row = db.session.get(model, row_id)
+                return row.version_id, row.status if model is Order else None
+
+        failures = 0
+        price = 0
+        for label, model, row_id, conditional in (
+            [('product If-Match', Product, product_id, 'header')] * rounds +
+            [('product version field', Product, product_id, 'field')] * rounds +
+            [('order If-Match', Order, order_id, 'header')] * rounds +
+            [('product unconditional', Product, product_id, None)] * rounds
+        ):
+            version, status = current_version(model, row_id)
+
+            def make_request(index, client, version=version, status=status, base_price=price):
+                if model is Order:
+                    choices = [choice for choice in ORDER_STATUSES if choice != status]
+                    url, body = f'/api/admin/orders/{row_id}/status', {'status': choices[index % len(choices)]}
+                else:
+                    # Distinct prices, so no write is a no-op that skips the UPDATE
+                    url, body = f'/api/admin/products/{row_id}', {'price': base_price + index + 1}
+                headers = {}
+                if conditional == 'header':
+                    headers['If-Match'] = f'"{version}"'
+                elif conditional == 'field':
+                    body['version'] = version
+                return client.put(url, json=body, headers=headers)
+
+            statuses = race(clients, make_request)
+            price += writers
+            new_version, _ = current_version(model, row_id)
+            successes = statuses.count(200)
+            conflicts = statuses.count(409)
+
+            if conditional:
+                ok = successes == 1 and conflicts == writers - 1 and new_version == version + 1
+            else:
+                ok = successes >= 1 and successes + conflicts == writers and new_version == version + successes
+            echo(f'{"ok" if ok else "FAILED":8} {label:24} {successes} x 200, {conflicts} x 409, version {version} -> {new_version}')
+            if not ok:
+                failures += 1
+                echo(f'{"":8} statuses: {sorted(statuses)}')
+
+        # A list of tags is a precondition too: it passes only if one of them is current
+        version, _ = current_version(Product, product_id)
+        for tags, expected in (([version - 1, version + 5], 409), ([version - 1, version], 200)):
+            header = ', '.join(f'"{tag}"' for tag in tags)
+            status_code = clients[0].put(
+                f'/api/admin/products/{product_id}', json={'price': price + 1}, headers={'If-Match': header}
+            ).status_code
+            price += 1
+            ok = status_code == expected
+            echo(f'{"ok" if ok else "FAILED":8} {"If-Match: " + header:24} {status_code} (expected {expected})')
+            if not ok:
+                failures += 1
+        return failures
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
@@ -3,129 +3,118 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask, current_app, send_from_directory
 from flask_cors import CORS
+from importlib import import_module
+from src.config import Config, engine_options, read_database_url
+from src.models.routing import REPLICA_BIND
 from src.models.user import db
-from src.routes.user import user_bp
-from src.routes.auth import auth_bp
-from src.routes.product import product_bp
-from src.routes.cart import cart_bp
-from src.routes.admin import admin_bp
-# from src.routes.upload import upload_bp  # Temporarily disabled for deployment
-
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-
-# Enable CORS for all routes
-CORS(app, supports_credentials=True)
-
-# Register blueprints
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(product_bp, url_prefix='/api')
-app.register_blueprint(cart_bp, url_prefix='/api')
-app.register_blueprint(admin_bp, url_prefix='/api/admin')
-# app.register_blueprint(upload_bp, url_prefix='/api')  # Temporarily disabled for deployment
-
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-# Create tables and add sample data
-with app.app_context():
-    db.create_all()
-    
-    # Import models after db initialization
-    from src.models.user import User
-    from src.models.product import Product
-    
-    # Create admin user if not exists
-    admin = User.query.filter_by(username='admin').first()
-    if not admin:
-        admin = User(
-            username='admin',
-            email='admin@petnicstudio.com',
-            first_name='Admin',
-            last_name='User',
-            is_admin=True
-        )
-        admin.set_password('Admin123!')
-        db.session.add(admin)
-    
-    # Add sample products if none exist
-    if Product.query.count() == 0:
-        sample_products = [
-            {
-                'name': 'Custom Pet T-Shirt',
-                'description': 'High-quality cotton t-shirt with your pet\'s custom portrait',
-                'price': 29.99,
-                'category': 'apparel',
-                'image_url': '/assets/sample-tshirt.jpg',
-                'stock_quantity': 100,
-                'is_featured': True
-            },
-            {
-                'name': 'Pet Portrait Mug',
-                'description': 'Ceramic mug featuring your pet\'s beautiful portrait',
-                'price': 19.99,
-                'category': 'drinkware',
-                'image_url': '/assets/sample-mug.jpg',
-                'stock_quantity': 50,
-                'is_featured': True
-            },
-            {
-                'name': 'Canvas Pet Print',
-                'description': 'Premium canvas print of your pet in artistic style',
-                'price': 49.99,
-                'category': 'prints',
-                'image_url': '/assets/sample-canvas.jpg',
-                'stock_quantity': 25,
-                'is_featured': True
-            },
-            {
-                'name': 'Pet Phone Case',
-                'description': 'Protective phone case with your pet\'s photo',
-                'price': 24.99,
-                'category': 'accessories',
-                'image_url': '/assets/sample-phonecase.jpg',
-                'stock_quantity': 75,
-                'is_featured': False
-            },
-            {
-                'name': 'Pet Pillow',
-                'description': 'Soft pillow featuring your beloved pet',
-                'price': 34.99,
-                'category': 'home',
-                'image_url': '/assets/sample-pillow.jpg',
-                'stock_quantity': 30,
-                'is_featured': False
-            }
-        ]
-        
-        for product_data in sample_products:
-            product = Product(**product_data)
-            db.session.add(product)
-    
-    db.session.commit()
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
+from src.commands import register_commands
+from src.utils.static_manifest import build_static_manifest, send_static_entry
+from src.utils.compression import init_compression
+from src.utils.database import init_engine_events
+from src.utils.metrics import init_metrics
+from src.utils.slow_queries import init_slow_query_log
+from src.utils.profiler import init_profiler
+
+# (module, blueprint, url prefix); modules are only imported when registered
+BLUEPRINTS = [
+    ('src.routes.user', 'user_bp', '/api'),
+    ('src.routes.auth', 'auth_bp', '/api/auth'),
+    ('src.routes.product', 'product_bp', '/api'),
+    ('src.routes.cart', 'cart_bp', '/api'),
+    ('src.routes.admin', 'admin_bp', '/api/admin'),
+]
+
+# Enabled with UPLOADS_ENABLED; pulls in Pillow and the image pool
+UPLOAD_BLUEPRINTS = [
+    ('src.routes.upload', 'upload_bp', '/api'),
+    ('src.routes.upload', 'media_bp', None),  # On-demand image sizes under /uploads
+]
+
+def register_blueprints(app):
+    blueprints = list(BLUEPRINTS)
+    if app.config['UPLOADS_ENABLED']:
+        blueprints += UPLOAD_BLUEPRINTS
+
+    for module_name, blueprint_name, url_prefix in blueprints:
+        blueprint = getattr(import_module(module_name), blueprint_name)
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
+
+    if app.config['UPLOADS_ENABLED']:
+        # Multipart file parts stream into size-checked temp files as they arrive
+        app.request_class = import_module('src.routes.upload').UploadRequest
+
+def create_app(config=None):
+    """Build a configured app without touching the database.
+
+    Tables and sample data are created by `flask init-db` and `flask seed`.
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+
+    # Enable CORS for all routes
+    CORS(app, supports_credentials=True)
+
+    init_metrics(app)
+    init_compression(app)
+
+    database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if 'SQLALCHEMY_ENGINE_OPTIONS' not in app.config:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_uri)
+    if 'SQLALCHEMY_BINDS' not in app.config:
+        # Reads in GET handlers go to this engine; see src/models/routing.py
+        read_url = read_database_url(database_uri)
+        app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: read_url} if read_url else {}
+    db.init_app(app)
+    init_engine_events(app)
+    init_slow_query_log(app)
+    register_blueprints(app)
+    register_commands(app)
+
+    # Describe the static tree once so requests never stat the filesystem
+    app.extensions['static_manifest'] = build_static_manifest(app.static_folder)
+    app.add_url_rule('/', 'serve', serve, defaults={'path': ''})
+    app.add_url_rule('/<path:path>', 'serve', serve)
+
+    init_profiler(app)
+
+    return app
+
 def serve(path):
-    static_folder_path = app.static_folder
+    static_folder_path = current_app.static_folder
     if static_folder_path is None:
             return "Static folder not configured", 404
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+    static_manifest = current_app.extensions['static_manifest']
+    entry = static_manifest.get(path)
+    if entry is not None:
+        return send_static_entry(entry)
+
+    # Uploads appear at runtime, so they are the one place still checked on disk
+    if path.startswith('uploads/') and os.path.isfile(os.path.join(static_folder_path, path)):
         return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+
+    # SPA fallback: client-side routes all resolve to index.html
+    index_entry = static_manifest.get('index.html')
+    if index_entry is not None:
+        return send_static_entry(index_entry)
+    return "index.html not found", 404
+
+app = create_app()
 
 
 if __name__ == "__main__":
+    # Local development: make sure the database exists before serving
+    from src.commands import init_db, seed_sample_data
+    with app.app_context():
+        init_db()
+        seed_sample_data()
+
+    from src.utils.reservations import start_reservation_sweeper
+    start_reservation_sweeper(app)
+
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
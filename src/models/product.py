@@ -1,6 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from src.models.user import db
+from sqlalchemy import event
+from sqlalchemy.orm import selectinload, object_session
+from sqlalchemy.orm.attributes import set_committed_value
 
 class Product(db.Model):
     __tablename__ = 'products'
@@ -16,6 +19,12 @@ class Product(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped on every UPDATE; an UPDATE from a stale read matches no row (StaleDataError)
+    version_id = db.Column(db.Integer, nullable=False, default=1)
+    # Position in the catalog change feed, reassigned on every write (see next_change_seq)
+    change_seq = db.Column(db.Integer, nullable=True, unique=True, index=True)
+    
+    __mapper_args__ = {'version_id_col': version_id}
     
     # Relationships
     cart_items = db.relationship('CartItem', backref='product', lazy=True, cascade='all, delete-orphan')
@@ -32,6 +41,7 @@ class Product(db.Model):
             'stock_quantity': self.stock_quantity,
             'is_featured': self.is_featured,
             'is_active': self.is_active,
+            'version': self.version_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -69,6 +79,9 @@ class Order(db.Model):
     shipping_address = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version_id = db.Column(db.Integer, nullable=False, default=1)
+    
+    __mapper_args__ = {'version_id_col': version_id}
     
     # Relationships
     order_items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
@@ -80,6 +93,7 @@ class Order(db.Model):
             'total_amount': self.total_amount,
             'status': self.status,
             'shipping_address': self.shipping_address,
+            'version': self.version_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'order_items': [item.to_dict() for item in self.order_items]
@@ -89,12 +103,36 @@ class OrderItem(db.Model):
     __tablename__ = 'order_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)  # Price at time of order
     custom_image_url = db.Column(db.String(200), nullable=True)
     custom_text = db.Column(db.Text, nullable=True)
+    # Product as it was at checkout, so reading an order never touches products
+    product_name = db.Column(db.String(100), nullable=True)
+    product_category = db.Column(db.String(50), nullable=True)
+    product_image_url = db.Column(db.String(200), nullable=True)
+    
+    def product_snapshot(self):
+        # Lines from before snapshots (until `flask backfill-order-snapshots`) fall back to the live product
+        if self.product_name is None:
+            load_unsnapshotted_products(object_session(self))
+            product = self.product
+            if not product:
+                return None
+            return {
+                'id': product.id,
+                'name': product.name,
+                'category': product.category,
+                'image_url': product.image_url
+            }
+        return {
+            'id': self.product_id,
+            'name': self.product_name,
+            'category': self.product_category,
+            'image_url': self.product_image_url
+        }
     
     def to_dict(self):
         return {
@@ -105,6 +143,133 @@ class OrderItem(db.Model):
             'price': self.price,
             'custom_image_url': self.custom_image_url,
             'custom_text': self.custom_text,
-            'product': self.product.to_dict() if self.product else None
+            'product': self.product_snapshot()
         }
 
+class ArchivedOrder(db.Model):
+    """A delivered or cancelled order moved out of `orders` by `flask archive-orders`.
+
+    Same columns and ids as Order, so to_dict() output is identical.
+    """
+    __tablename__ = 'archived_orders'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    total_amount = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    shipping_address = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, index=True)
+    updated_at = db.Column(db.DateTime)
+    version_id = db.Column(db.Integer, nullable=False, default=1)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    order_items = db.relationship('ArchivedOrderItem', backref='order', lazy=True)
+    
+    to_dict = Order.to_dict
+
+class ArchivedOrderItem(db.Model):
+    """A line of an ArchivedOrder"""
+    __tablename__ = 'archived_order_items'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('archived_orders.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    custom_image_url = db.Column(db.String(200), nullable=True)
+    custom_text = db.Column(db.Text, nullable=True)
+    product_name = db.Column(db.String(100), nullable=True)
+    product_category = db.Column(db.String(50), nullable=True)
+    product_image_url = db.Column(db.String(200), nullable=True)
+    
+    product = db.relationship('Product')
+    
+    product_snapshot = OrderItem.product_snapshot
+    to_dict = OrderItem.to_dict
+
+class StockReservation(db.Model):
+    """Stock held for a cart line until expires_at; one row per user and product"""
+    __tablename__ = 'stock_reservations'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_id', name='uq_stock_reservations_user_product'),
+        # Covers the live-reservation sum per product without touching the table
+        db.Index('ix_stock_reservations_product_expires', 'product_id', 'expires_at', 'quantity'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ChangeCounter(db.Model):
+    """Last change_seq handed out, per feed"""
+    __tablename__ = 'change_counters'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+PRODUCT_FEED = 'products'
+
+def next_change_seq(connection, count=1):
+    """Reserve `count` consecutive product change numbers; returns the last one.
+
+    Incrementing the counter row write-locks it until commit, so concurrent
+    writers commit in the order their numbers were handed out and a feed
+    reader never sees a later number before an earlier one.
+    """
+    counters = ChangeCounter.__table__
+    increment = counters.update().where(counters.c.name == PRODUCT_FEED).values(value=counters.c.value + count)
+    if connection.dialect.update_returning:
+        # SQLite 3.35+ and PostgreSQL: one round trip
+        value = connection.execute(increment.returning(counters.c.value)).scalar()
+        if value is not None:
+            return value
+    elif connection.execute(increment).rowcount:
+        return connection.execute(db.select(counters.c.value).where(counters.c.name == PRODUCT_FEED)).scalar()
+    
+    # First write since the table appeared; continue after anything already numbered
+    last = connection.execute(db.select(db.func.coalesce(db.func.max(Product.change_seq), 0))).scalar()
+    connection.execute(counters.insert().values(name=PRODUCT_FEED, value=last + count))
+    return last + count
+
+@event.listens_for(Product, 'before_insert')
+def _number_new_product(mapper, connection, target):
+    target.change_seq = next_change_seq(connection)
+
+@event.listens_for(Product, 'before_update')
+def _number_changed_product(mapper, connection, target):
+    # before_update also fires for relationship-only changes, which the feed does not carry
+    if object_session(target).is_modified(target, include_collections=False):
+        target.change_seq = next_change_seq(connection)
+
+def load_unsnapshotted_products(session):
+    """Give every loaded line still without a snapshot its product, in one query.
+
+    Lines not yet backfilled then cost one query per request instead of a
+    lazy load each, and fully backfilled orders never read products at all.
+    """
+    if session is None:
+        return
+    items = [
+        item for item in list(session.identity_map.values())
+        if isinstance(item, (OrderItem, ArchivedOrderItem)) and item.product_name is None
+        and 'product' not in item.__dict__
+    ]
+    if not items:
+        return
+    products = session.execute(
+        db.select(Product).where(Product.id.in_({item.product_id for item in items}))
+    ).scalars().all()
+    products = {product.id: product for product in products}
+    for item in items:
+        set_committed_value(item, 'product', products.get(item.product_id))
+
+def load_order_details():
+    """Loader option for Order.to_dict(): all lines in one query; they carry their own product snapshot"""
+    return selectinload(Order.order_items)
+
+def load_archived_order_details():
+    """load_order_details() for ArchivedOrder"""
+    return selectinload(ArchivedOrder.order_items)
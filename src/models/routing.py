@@ -0,0 +1,33 @@
+from flask import g, has_request_context, request, session as client_session
+from flask_sqlalchemy.session import Session
+import time
+
+READ_METHODS = {'GET', 'HEAD'}
+REPLICA_BIND = 'replica'
+
+def use_primary(seconds=None):
+    """Send this request's reads to the primary.
+
+    With `seconds`, the client's following requests stick to the primary too,
+    so a customer sees their own write (e.g. a new order) straight away.
+    """
+    g.use_primary = True
+    if seconds:
+        client_session['read_primary_until'] = time.time() + seconds
+
+def reads_from_replica():
+    if not has_request_context() or request.method not in READ_METHODS:
+        return False
+    if g.get('use_primary') or request.headers.get('X-Read-Primary'):
+        return False
+    return client_session.get('read_primary_until', 0) <= time.time()
+
+class RoutingSession(Session):
+    """Routes reads in GET/HEAD requests to the read-only 'replica' bind, everything else to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and reads_from_replica():
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,34 @@
+from datetime import datetime
+from src.models.user import db
+import json
+
+class UploadedFile(db.Model):
+    __tablename__ = 'uploaded_files'
+
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), unique=True, nullable=False)  # SHA-256 of the original bytes
+    filename = db.Column(db.String(100), unique=True, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    variants = db.Column(db.Text, nullable=True)  # JSON map of rendition name -> URL
+    ref_count = db.Column(db.Integer, nullable=False, default=1)  # Number of UploadReference rows
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'filename': self.filename,
+            'url': f"/uploads/{self.filename}",
+            'size': self.size,
+            'variants': json.loads(self.variants) if self.variants else {}
+        }
+
+class UploadReference(db.Model):
+    """One user's claim on a (possibly shared) UploadedFile; released by that user's delete, once"""
+    __tablename__ = 'upload_references'
+    __table_args__ = (
+        db.UniqueConstraint('upload_id', 'user_id', name='uq_upload_references_upload_user'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    upload_id = db.Column(db.Integer, db.ForeignKey('uploaded_files.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
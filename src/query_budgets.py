@@ -0,0 +1,296 @@
+"""SQL statement budgets for every route, checked with `flask check-query-budgets`.
+
+Each route is requested once through the test client against an in-memory
+database seeded with many orders and cart items, and fails if it answers
+with another status than expected or runs more statements than its budget. Budgets are fixed numbers, so a per-row lazy
+load (e.g. in Order.to_dict or CartItem.to_dict) blows them immediately.
+"""
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from src.models.user import db, User
+from src.utils.querycount import count_queries
+import io
+import tempfile
+
+# endpoint -> most SQL statements one request may run against the seeded data
+QUERY_BUDGETS = {
+    'serve': 0,
+
+    'user.get_users': 1,
+    'user.get_user': 1,
+    'user.create_user': 2,
+    'user.update_user': 3,
+    'user.delete_user': 4,
+
+    'auth.register': 4,
+    'auth.login': 1,
+    'auth.logout': 0,
+    'auth.get_current_user': 1,
+    'auth.update_profile': 4,
+    'auth.change_password': 2,
+
+    'product.get_products': 1,
+    'product.get_product': 1,
+    'product.get_product_changes': 1,
+    'product.create_product': 3,
+    'product.update_product': 4,
+    'product.delete_product': 3,
+    'product.get_categories': 1,
+
+    'cart.get_cart': 2,
+    'cart.add_to_cart': 9,
+    'cart.update_cart_item': 8,
+    'cart.remove_from_cart': 4,
+    'cart.clear_cart': 3,
+    'cart.checkout': 11,
+    'cart.get_orders': 5,
+    'cart.get_order': 4,
+    'cart.stream_orders': 1,
+
+    'admin.admin_dashboard': 8,
+    'admin.get_users': 3,
+    'admin.update_user': 4,
+    'admin.admin_get_products': 3,
+    'admin.admin_create_product': 4,
+    'admin.admin_update_product': 5,
+    'admin.admin_delete_product': 4,
+    'admin.admin_get_orders': 7,
+    'admin.admin_stream_orders': 1,
+    'admin.update_order_status': 5,
+    'admin.get_metrics': 1,
+    'admin.get_slow_queries': 1,
+    'admin.get_profiles': 1,
+    'admin.get_profile': 1,
+    'admin.export_orders': 2,
+    'admin.export_users': 2,
+
+    'upload.upload_file': 4,
+    'upload.upload_multiple_files': 8,
+    'upload.delete_file': 4,
+    'media.get_upload': 0,
+}
+
+# Seeded data: large enough that any per-row query shows up as a blown budget
+BUDGET_PRODUCTS = 40
+BUDGET_USERS = 50
+BUDGET_ORDERS = 60
+BUDGET_ITEMS_PER_ORDER = 5
+BUDGET_CART_ITEMS = 25
+
+PASSWORD = 'Budget123!'
+
+def seed_budget_data():
+    """Populate the (empty) database; returns ids the request list refers to"""
+    from src.models.product import Product, CartItem, Order, OrderItem, ArchivedOrder
+    from src.utils.archive import archive_orders
+
+    password_hash = generate_password_hash(PASSWORD)
+    admin = User(username='admin', email='admin@example.com', password_hash=password_hash, is_admin=True)
+    shopper = User(username='shopper', email='shopper@example.com', password_hash=password_hash)
+    users = [
+        User(username=f'user{index}', email=f'user{index}@example.com', password_hash=password_hash)
+        for index in range(BUDGET_USERS)
+    ]
+    products = [
+        Product(
+            name=f'Product {index}', description='Seeded for query budgets', price=10 + index,
+            category=f'category{index % 5}', stock_quantity=1000, is_featured=index % 4 == 0
+        )
+        for index in range(BUDGET_PRODUCTS)
+    ]
+    db.session.add_all([admin, shopper] + users + products)
+    db.session.flush()
+
+    now = datetime.utcnow()
+    for index in range(BUDGET_ORDERS):
+        # The older half is delivered long ago and gets archived below
+        created_at = now - timedelta(hours=index) if index < BUDGET_ORDERS // 2 else now - timedelta(days=200 + index)
+        order = Order(
+            user_id=shopper.id, total_amount=0, shipping_address='1 Budget Street',
+            status='pending' if index < BUDGET_ORDERS // 2 else 'delivered',
+            created_at=created_at, updated_at=created_at
+        )
+        for line in range(BUDGET_ITEMS_PER_ORDER):
+            product = products[(index + line) % BUDGET_PRODUCTS]
+            order.order_items.append(OrderItem(
+                product_id=product.id, quantity=1, price=product.price,
+                product_name=product.name, product_category=product.category, product_image_url=product.image_url
+            ))
+            order.total_amount += product.price
+        db.session.add(order)
+
+    for index in range(BUDGET_CART_ITEMS):
+        db.session.add(CartItem(user_id=shopper.id, product_id=products[index].id, quantity=1))
+    db.session.commit()
+    archive_orders(older_than_days=30, echo=lambda message: None)
+
+    first_order = Order.query.filter_by(user_id=shopper.id).order_by(Order.id).first()
+    archived_order = ArchivedOrder.query.filter_by(user_id=shopper.id).order_by(ArchivedOrder.id).first()
+    first_item = CartItem.query.filter_by(user_id=shopper.id).order_by(CartItem.id).first()
+    return {
+        'shopper_id': shopper.id,
+        'user_id': users[0].id,
+        'spare_user_id': users[-1].id,
+        'product_id': products[0].id,
+        'spare_product_id': products[-1].id,
+        'order_id': first_order.id,
+        'archived_order_id': archived_order.id,
+        'cart_item_id': first_item.id,
+        'second_cart_item_id': first_item.id + 1,
+    }
+
+def sample_image(color):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), color).save(buffer, 'PNG')
+    buffer.seek(0)
+    return buffer
+
+def budget_requests(ids):
+    """(endpoint, client role, method, url, expected status, request kwargs), in an order that keeps data valid"""
+    return [
+        ('serve', None, 'GET', '/', 200, {}),
+        ('product.get_products', None, 'GET', '/api/products', 200, {}),
+        ('product.get_product', None, 'GET', f"/api/products/{ids['product_id']}", 200, {}),
+        ('product.get_product_changes', None, 'GET', '/api/products/changes?since=10&limit=20', 200, {}),
+        ('product.get_categories', None, 'GET', '/api/categories', 200, {}),
+        ('user.get_users', None, 'GET', '/api/users', 200, {}),
+        ('user.get_user', None, 'GET', f"/api/users/{ids['user_id']}", 200, {}),
+        ('user.create_user', None, 'POST', '/api/users', 201, {'json': {
+            'username': 'budget', 'email': 'budget@example.com', 'password': PASSWORD,
+        }}),
+        ('user.update_user', None, 'PUT', f"/api/users/{ids['user_id']}", 200, {'json': {'username': 'renamed'}}),
+        ('user.delete_user', None, 'DELETE', f"/api/users/{ids['spare_user_id']}", 204, {}),
+        ('auth.register', None, 'POST', '/api/auth/register', 201, {'json': {
+            'username': 'newcomer', 'email': 'newcomer@example.com', 'password': PASSWORD,
+        }}),
+        ('auth.login', None, 'POST', '/api/auth/login', 200, {'json': {'username': 'shopper', 'password': PASSWORD}}),
+
+        ('auth.get_current_user', 'shopper', 'GET', '/api/auth/me', 200, {}),
+        ('auth.update_profile', 'shopper', 'PUT', '/api/auth/profile', 200, {'json': {
+            'first_name': 'Shop', 'email': 'shopper@example.com',
+        }}),
+        ('auth.change_password', 'shopper', 'POST', '/api/auth/change-password', 200, {'json': {
+            'current_password': PASSWORD, 'new_password': PASSWORD,
+        }}),
+        ('cart.get_cart', 'shopper', 'GET', '/api/cart', 200, {}),
+        ('cart.add_to_cart', 'shopper', 'POST', '/api/cart', 201, {'json': {'product_id': ids['spare_product_id'], 'quantity': 2}}),
+        ('cart.update_cart_item', 'shopper', 'PUT', f"/api/cart/{ids['cart_item_id']}", 200, {'json': {'quantity': 3}}),
+        ('cart.remove_from_cart', 'shopper', 'DELETE', f"/api/cart/{ids['second_cart_item_id']}", 200, {}),
+        ('cart.get_orders', 'shopper', 'GET', '/api/orders', 200, {}),
+        ('cart.get_order', 'shopper', 'GET', f"/api/orders/{ids['archived_order_id']}", 200, {}),
+        ('cart.stream_orders', 'shopper', 'GET', '/api/orders/stream', 200, {'stream': True}),
+        ('cart.checkout', 'shopper', 'POST', '/api/checkout', 201, {'json': {'shipping_address': '1 Budget Street'}}),
+        ('cart.clear_cart', 'shopper', 'DELETE', '/api/cart/clear', 200, {}),
+        ('upload.upload_file', 'shopper', 'POST', '/api/upload', 200, {
+            'data': {'file': (sample_image('red'), 'budget.png')}, 'content_type': 'multipart/form-data',
+        }),
+        ('upload.upload_multiple_files', 'shopper', 'POST', '/api/upload/multiple', 200, {
+            'data': {'files': [(sample_image('green'), 'a.png'), (sample_image('blue'), 'b.png')]},
+            'content_type': 'multipart/form-data',
+        }),
+        ('media.get_upload', 'shopper', 'GET', '/uploads/{upload}?w=32', 200, {}),
+        ('upload.delete_file', 'shopper', 'DELETE', '/api/delete/{upload}', 200, {}),
+        ('auth.logout', 'shopper', 'POST', '/api/auth/logout', 200, {}),
+
+        ('admin.admin_dashboard', 'admin', 'GET', '/api/admin/dashboard', 200, {}),
+        ('admin.get_users', 'admin', 'GET', '/api/admin/users', 200, {}),
+        ('admin.update_user', 'admin', 'PUT', f"/api/admin/users/{ids['user_id']}", 200, {'json': {'first_name': 'Updated'}}),
+        ('admin.admin_get_products', 'admin', 'GET', '/api/admin/products', 200, {}),
+        ('admin.admin_create_product', 'admin', 'POST', '/api/admin/products', 201, {'json': {'name': 'New', 'price': 5}}),
+        ('admin.admin_update_product', 'admin', 'PUT', f"/api/admin/products/{ids['product_id']}", 200, {'json': {'price': 11}}),
+        ('admin.admin_delete_product', 'admin', 'DELETE', f"/api/admin/products/{ids['spare_product_id']}", 200, {}),
+        ('admin.admin_get_orders', 'admin', 'GET', '/api/admin/orders?per_page=40', 200, {}),  # Spans both tiers
+        ('admin.admin_stream_orders', 'admin', 'GET', '/api/admin/orders/stream', 200, {'stream': True}),
+        ('admin.update_order_status', 'admin', 'PUT', f"/api/admin/orders/{ids['order_id']}/status", 200, {'json': {'status': 'shipped'}}),
+        ('admin.get_metrics', 'admin', 'GET', '/api/admin/metrics', 200, {}),
+        ('admin.get_slow_queries', 'admin', 'GET', '/api/admin/slow-queries', 200, {}),
+        ('admin.get_profiles', 'admin', 'GET', '/api/admin/profiles', 200, {}),
+        ('admin.get_profile', 'admin', 'GET', '/api/admin/profiles/{profile}', 200, {}),
+        ('admin.export_orders', 'admin', 'GET', '/api/admin/orders/export?format=ndjson', 200, {}),
+        ('admin.export_users', 'admin', 'GET', '/api/admin/users/export', 200, {}),
+        ('product.create_product', 'admin', 'POST', '/api/products', 201, {'json': {'name': 'Another', 'price': 7}}),
+        ('product.update_product', 'admin', 'PUT', f"/api/products/{ids['product_id']}", 200, {'json': {'price': 12}}),
+        ('product.delete_product', 'admin', 'DELETE', f"/api/products/{ids['product_id']}", 200, {}),
+    ]
+
+def check_query_budgets(echo=print):
+    """Run every budgeted request; returns the number of failures"""
+    from src.main import create_app
+    from src.commands import init_db
+
+    with tempfile.TemporaryDirectory() as profile_dir:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+            'SQLALCHEMY_BINDS': {},
+            'UPLOADS_ENABLED': True,
+            'SLOW_QUERY_LOG': '',
+            'PROFILE_DIR': profile_dir,
+        })
+        with app.app_context():
+            init_db()
+            ids = seed_budget_data()
+        return run_budget_requests(app, ids, echo)
+
+def run_budget_requests(app, ids, echo):
+    clients = {None: app.test_client()}
+    for role in ('shopper', 'admin'):
+        clients[role] = app.test_client()
+        clients[role].post('/api/auth/login', json={'username': role, 'password': PASSWORD})
+    # A stored profile for admin.get_profile to serve; it is saved once the body is closed
+    profile = clients['admin'].get(
+        '/api/admin/profiles', headers={'X-Profile': '1'}, buffered=True
+    ).headers.get('X-Profile-Id')
+
+    failures = 0
+    exercised = set()
+    upload = None
+    leftover_uploads = []
+    for endpoint, role, method, url, expected_status, kwargs in budget_requests(ids):
+        url = url.replace('{upload}', upload or 'missing.jpg').replace('{profile}', profile or 'missing')
+
+        # Event streams never end, so only the request up to the first byte is counted
+        stream = kwargs.pop('stream', False)
+        with count_queries() as counter:
+            response = clients[role].open(url, method=method, **kwargs)
+            if not stream:
+                response.get_data()  # Streamed responses query while the body is consumed
+        if stream:
+            response.close()
+        if endpoint == 'upload.upload_file' and response.is_json:
+            upload = response.get_json().get('filename')
+        if endpoint == 'upload.upload_multiple_files' and response.is_json:
+            leftover_uploads = [item.get('filename') for item in response.get_json().get('uploaded_files', [])]
+
+        exercised.add(endpoint)
+        budget = QUERY_BUDGETS.get(endpoint)
+        status = 'ok'
+        if budget is None:
+            status = 'NO BUDGET'
+        elif response.status_code != expected_status:
+            # A budget measured on an error response says nothing about the route
+            status = f'HTTP {response.status_code}'
+        elif counter.count > budget:
+            status = 'OVER BUDGET'
+        echo(f'{status:12} {endpoint:32} {response.status_code} {counter.count}/{budget} statements')
+        if status != 'ok':
+            failures += 1
+            if status.startswith('HTTP'):
+                echo(f'{"":12}   expected HTTP {expected_status}: {response.get_data(as_text=True)[:200]}')
+            for shape, count in counter.duplicates():
+                echo(f'{"":12}   {count}x {shape}')
+
+    # Don't leave the sample images behind in the static folder; only their owner may delete them
+    clients['shopper'].post('/api/auth/login', json={'username': 'shopper', 'password': PASSWORD})
+    for filename in leftover_uploads:
+        clients['shopper'].delete(f'/api/delete/{filename}')
+
+    # A new route must come with a budget, and a budget with a request that checks it
+    routed = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint != 'static'}
+    for endpoint in sorted(routed - exercised):
+        echo(f'{"NOT CHECKED":12} {endpoint}: add it to QUERY_BUDGETS and budget_requests()')
+        failures += 1
+    for endpoint in sorted(set(QUERY_BUDGETS) - routed):
+        echo(f'{"STALE":12} {endpoint}: budgeted but no longer routed')
+        failures += 1
+    return failures
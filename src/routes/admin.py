@@ -1,10 +1,28 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context, current_app, send_file
 from src.models.user import db, User
-from src.models.product import Product, Order, OrderItem
+from src.models.product import Product, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, load_order_details
+from src.utils.metrics import render_prometheus
+from src.utils.slow_queries import read_slow_queries
+from src.utils.profiler import list_profiles, profile_path, profile_text
+from src.utils.versioning import InvalidVersion, requested_versions, version_conflict
+from src.utils.pubsub import ADMIN_ORDERS_TOPIC, publish_order, stream_response
+from src.utils.archive import paginate_orders
+from sqlalchemy.orm.exc import StaleDataError
 from functools import wraps
+from datetime import datetime, timedelta
+import csv
+import io
+import json
+import zlib
 
 admin_bp = Blueprint('admin', __name__)
 
+# Export configuration
+EXPORT_BATCH_SIZE = 1000  # Rows fetched per round trip from the server-side cursor
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+PROFILE_SORTS = ['cumulative', 'tottime', 'ncalls', 'pcalls', 'filename', 'name']
+
 def require_admin():
     """Decorator to require admin authentication"""
     def decorator(f):
@@ -29,18 +47,27 @@ def admin_dashboard():
         # Get dashboard statistics
         total_users = User.query.count()
         total_products = Product.query.filter_by(is_active=True).count()
-        total_orders = Order.query.count()
+        total_orders = db.session.execute(db.select(
+            db.select(db.func.count(Order.id)).scalar_subquery() +
+            db.select(db.func.count(ArchivedOrder.id)).scalar_subquery()
+        )).scalar()
         pending_orders = Order.query.filter_by(status='pending').count()
         
         # Recent orders
-        recent_orders = Order.query.order_by(Order.created_at.desc()).limit(5).all()
+        recent_orders = Order.query.options(load_order_details()).order_by(Order.created_at.desc()).limit(5).all()
         
         # Revenue calculation (last 30 days)
         from datetime import datetime, timedelta
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_revenue = db.session.query(db.func.sum(Order.total_amount)).filter(
-            Order.created_at >= thirty_days_ago
-        ).scalar() or 0
+        # Archived orders count too when ORDER_ARCHIVE_DAYS is shorter than the window
+        recent_revenue = db.session.execute(db.select(
+            db.select(db.func.coalesce(db.func.sum(Order.total_amount), 0)).where(
+                Order.created_at >= thirty_days_ago
+            ).scalar_subquery() +
+            db.select(db.func.coalesce(db.func.sum(ArchivedOrder.total_amount), 0)).where(
+                ArchivedOrder.created_at >= thirty_days_ago
+            ).scalar_subquery()
+        )).scalar() or 0
         
         return jsonify({
             'stats': {
@@ -186,6 +213,10 @@ def admin_update_product(product_id):
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
+        expected_versions = requested_versions(data)
+        if expected_versions is not None and product.version_id not in expected_versions:
+            return version_conflict(product)
+        
         if 'name' in data:
             product.name = data['name']
         if 'description' in data:
@@ -205,6 +236,12 @@ def admin_update_product(product_id):
         
         db.session.commit()
         return jsonify(product.to_dict()), 200
+    except InvalidVersion as e:
+        return jsonify({'error': str(e)}), 400
+    except StaleDataError:
+        # Another writer committed between our read and our UPDATE
+        db.session.rollback()
+        return version_conflict(db.session.get(Product, product_id))
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -217,6 +254,9 @@ def admin_delete_product(product_id):
         product.is_active = False  # Soft delete
         db.session.commit()
         return jsonify({'message': 'Product deleted successfully'}), 200
+    except StaleDataError:
+        db.session.rollback()
+        return version_conflict(db.session.get(Product, product_id))
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -229,24 +269,27 @@ def admin_get_orders():
         per_page = request.args.get('per_page', 20, type=int)
         status = request.args.get('status', '')
         
-        query = Order.query
-        
-        if status:
-            query = query.filter_by(status=status)
-        
-        orders = query.order_by(Order.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # Archived orders page in with the hot ones, newest first
+        orders, total, pages = paginate_orders(page, per_page, status)
         
         return jsonify({
-            'orders': [order.to_dict() for order in orders.items],
-            'total': orders.total,
-            'pages': orders.pages,
+            'orders': [order.to_dict() for order in orders],
+            'total': total,
+            'pages': pages,
             'current_page': page
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/orders/stream', methods=['GET'])
+@require_admin()
+def admin_stream_orders():
+    """Server-sent events with {order_id, status, updated_at} for every order placed or updated"""
+    try:
+        return stream_response([ADMIN_ORDERS_TOPIC])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @admin_bp.route('/orders/<int:order_id>/status', methods=['PUT'])
 @require_admin()
 def update_order_status(order_id):
@@ -261,11 +304,289 @@ def update_order_status(order_id):
         if data['status'] not in valid_statuses:
             return jsonify({'error': 'Invalid status'}), 400
         
+        expected_versions = requested_versions(data)
+        if expected_versions is not None and order.version_id not in expected_versions:
+            return version_conflict(order)
+        
         order.status = data['status']
         db.session.commit()
         
+        # The commit expired everything; reload lines and products in bulk for the response
+        order = Order.query.options(load_order_details()).filter_by(id=order_id).first()
+        publish_order(order)
         return jsonify(order.to_dict()), 200
+    except InvalidVersion as e:
+        return jsonify({'error': str(e)}), 400
+    except StaleDataError:
+        db.session.rollback()
+        return version_conflict(Order.query.options(load_order_details()).filter_by(id=order_id).first())
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/metrics', methods=['GET'])
+@require_admin()
+def get_metrics():
+    """Latency and SQL metrics for this process, in Prometheus text format"""
+    try:
+        return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/slow-queries', methods=['GET'])
+@require_admin()
+def get_slow_queries():
+    """Most recent slow statements, newest first; ?full_scans=1 keeps only plans with table scans"""
+    try:
+        limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+        only_full_scans = request.args.get('full_scans', '').lower() in ('1', 'true')
+        
+        log_path = current_app.config.get('SLOW_QUERY_LOG')
+        entries = read_slow_queries(log_path, limit) if log_path else []
+        if only_full_scans:
+            entries = [entry for entry in entries if entry.get('full_scans')]
+        
+        return jsonify({
+            'threshold_ms': current_app.config['SLOW_QUERY_MS'],
+            'entries': entries
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/profiles', methods=['GET'])
+@require_admin()
+def get_profiles():
+    """Stored request profiles, newest first; record one by sending X-Profile: 1 as an admin"""
+    try:
+        return jsonify(list_profiles(current_app.config['PROFILE_DIR'])), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/profiles/<profile_id>', methods=['GET'])
+@require_admin()
+def get_profile(profile_id):
+    """A profile as a pstats file (default) or, with ?format=text, a report sorted by ?sort="""
+    try:
+        path = profile_path(current_app.config['PROFILE_DIR'], profile_id)
+        if not path:
+            return jsonify({'error': 'Profile not found'}), 404
+        
+        if request.args.get('format', 'pstats') == 'text':
+            sort = request.args.get('sort', 'cumulative')
+            if sort not in PROFILE_SORTS:
+                return jsonify({'error': f"Invalid sort. Allowed values: {', '.join(PROFILE_SORTS)}"}), 400
+            limit = min(request.args.get('limit', 60, type=int), 1000)
+            return Response(profile_text(path, sort, limit), mimetype='text/plain')
+        
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=f'{profile_id}.pstats')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Columns of the order itself, and of each of its lines (nested under order_items in NDJSON)
+ORDER_FIELDS = (
+    'order_id', 'user_id', 'username', 'status', 'total_amount', 'shipping_address',
+    'created_at', 'updated_at'
+)
+ITEM_FIELDS = (
+    'item_id', 'product_id', 'product_name', 'quantity', 'price', 'custom_image_url', 'custom_text'
+)
+ORDER_EXPORT_FIELDS = ORDER_FIELDS + ITEM_FIELDS
+
+USER_EXPORT_FIELDS = [
+    'id', 'username', 'email', 'first_name', 'last_name', 'phone', 'address',
+    'is_admin', 'is_active', 'created_at', 'updated_at'
+]
+
+def parse_export_date(value, end_of_day=False):
+    """Parse an ISO date/datetime query argument; bare dates cover the whole day"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end_of_day and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def stream_export(records, fields, fmt, filename, compress=False):
+    """Encode an iterator of dicts as CSV/NDJSON chunks, optionally gzipped.
+
+    Rows are flushed once per batch so memory stays flat no matter how many
+    records the cursor produces.
+    """
+    def generate():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        buffer = io.StringIO()
+        writer = None
+        if fmt == 'csv':
+            writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+
+        def flush():
+            chunk = buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            return compressor.compress(chunk) if compressor else chunk
+
+        for count, record in enumerate(records, 1):
+            record = {key: export_value(value) for key, value in record.items()}
+            if writer:
+                writer.writerow(record)
+            else:
+                buffer.write(json.dumps(record) + '\n')
+            if count % EXPORT_BATCH_SIZE == 0:
+                chunk = flush()
+                if chunk:
+                    yield chunk
+
+        chunk = flush()
+        if compressor:
+            chunk += compressor.flush()
+        if chunk:
+            yield chunk
+
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    else:
+        mimetype = EXPORT_FORMATS[fmt]
+
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['X-Accel-Buffering'] = 'no'  # Let proxies pass chunks straight through
+    return response
+
+def iter_order_export(rows, nested):
+    """Turn joined order/line rows into flat CSV lines or one nested record per order.
+
+    Rows arrive ordered by order id, so only the order currently being
+    assembled is ever held in memory.
+    """
+    current = None
+    for row in rows:
+        line = row._asdict()
+        if not nested:
+            yield line
+            continue
+
+        if current is None or current['order_id'] != line['order_id']:
+            if current is not None:
+                yield current
+            current = {field: line[field] for field in ORDER_FIELDS}
+            current['created_at'] = export_value(current['created_at'])
+            current['updated_at'] = export_value(current['updated_at'])
+            current['order_items'] = []
+
+        if line['item_id'] is not None:
+            current['order_items'].append({field: line[field] for field in ITEM_FIELDS})
+
+    if current is not None:
+        yield current
+
+@admin_bp.route('/orders/export', methods=['GET'])
+@require_admin()
+def export_orders():
+    try:
+        fmt = request.args.get('format', 'csv').lower()
+        status = request.args.get('status', '')
+        compress = request.args.get('gzip', '').lower() in ('1', 'true')
+
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({'error': 'Invalid format. Allowed formats: csv, ndjson'}), 400
+
+        try:
+            start = parse_export_date(request.args.get('start'))
+            end = parse_export_date(request.args.get('end'), end_of_day=True)
+        except ValueError:
+            return jsonify({'error': 'Invalid date. Use ISO format, e.g. 2024-01-31'}), 400
+
+        # One row per order line; orders without lines still get a row. Archived
+        # orders keep their ids, so both tiers merge into one id-ordered stream
+        selects = []
+        for order_model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+            query = db.select(
+                order_model.id.label('order_id'),
+                order_model.user_id,
+                User.username,
+                order_model.status,
+                order_model.total_amount,
+                order_model.shipping_address,
+                order_model.created_at,
+                order_model.updated_at,
+                item_model.id.label('item_id'),
+                item_model.product_id,
+                db.func.coalesce(item_model.product_name, Product.name).label('product_name'),
+                item_model.quantity,
+                item_model.price,
+                item_model.custom_image_url,
+                item_model.custom_text
+            ).select_from(order_model).join(
+                User, User.id == order_model.user_id
+            ).outerjoin(
+                item_model, item_model.order_id == order_model.id
+            ).outerjoin(
+                Product, Product.id == item_model.product_id
+            )
+            
+            if status:
+                query = query.where(order_model.status == status)
+            if start:
+                query = query.where(order_model.created_at >= start)
+            if end:
+                query = query.where(order_model.created_at < end)
+            selects.append(query)
+        
+        export = db.union_all(*selects).subquery()
+        query = db.select(export).order_by(export.c.order_id, export.c.item_id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        rows = db.session.execute(query)
+
+        return stream_export(
+            iter_order_export(rows, nested=(fmt == 'ndjson')),
+            ORDER_EXPORT_FIELDS, fmt, f'orders.{fmt}', compress
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/users/export', methods=['GET'])
+@require_admin()
+def export_users():
+    try:
+        fmt = request.args.get('format', 'csv').lower()
+        status = request.args.get('status', '')
+        compress = request.args.get('gzip', '').lower() in ('1', 'true')
+
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({'error': 'Invalid format. Allowed formats: csv, ndjson'}), 400
+
+        if status not in ('', 'active', 'inactive'):
+            return jsonify({'error': 'Invalid status. Allowed statuses: active, inactive'}), 400
+
+        try:
+            start = parse_export_date(request.args.get('start'))
+            end = parse_export_date(request.args.get('end'), end_of_day=True)
+        except ValueError:
+            return jsonify({'error': 'Invalid date. Use ISO format, e.g. 2024-01-31'}), 400
+
+        # Explicit columns keep password hashes out of the export
+        query = db.select(*[getattr(User, field) for field in USER_EXPORT_FIELDS])
+
+        if status:
+            query = query.where(User.is_active == (status == 'active'))
+        if start:
+            query = query.where(User.created_at >= start)
+        if end:
+            query = query.where(User.created_at < end)
+
+        query = query.order_by(User.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        rows = db.session.execute(query)
+
+        return stream_export(
+            (row._asdict() for row in rows),
+            USER_EXPORT_FIELDS, fmt, f'users.{fmt}', compress
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,6 +1,11 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, current_app
 from src.models.user import db, User
-from src.models.product import Product, CartItem, Order, OrderItem
+from src.models.product import Product, CartItem, Order, OrderItem, load_order_details, next_change_seq
+from sqlalchemy.orm import joinedload
+from src.models.routing import use_primary
+from src.utils.reservations import InsufficientStock, available_stock, reserve, release
+from src.utils.pubsub import publish_order, stream_response, user_orders_topic
+from src.utils.archive import find_order, user_orders
 
 cart_bp = Blueprint('cart', __name__)
 
@@ -17,7 +22,7 @@ def get_cart():
         if not user:
             return jsonify({'error': 'Authentication required'}), 401
         
-        cart_items = CartItem.query.filter_by(user_id=user.id).all()
+        cart_items = CartItem.query.options(joinedload(CartItem.product)).filter_by(user_id=user.id).all()
         return jsonify([item.to_dict() for item in cart_items]), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -38,8 +43,11 @@ def add_to_cart():
         custom_image_url = data.get('custom_image_url', '')
         custom_text = data.get('custom_text', '')
         
-        # Validate product exists and is active
-        product = Product.query.get(product_id)
+        if quantity <= 0:
+            return jsonify({'error': 'Quantity must be positive'}), 400
+        
+        # Validate product exists and is active (row-locked on PostgreSQL until commit)
+        product = Product.query.with_for_update().filter_by(id=product_id).first()
         if not product or not product.is_active:
             return jsonify({'error': 'Product not found'}), 404
         
@@ -68,8 +76,14 @@ def add_to_cart():
             )
             db.session.add(cart_item)
         
+        # Hold the stock now so shortages show up here, not at checkout
+        reserve(user.id, product_id, cart_item.quantity)
+        
         db.session.commit()
         return jsonify(cart_item.to_dict()), 201
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({'error': 'Not enough stock', 'product_id': e.product_id, 'available': e.available}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -89,12 +103,15 @@ def update_cart_item(item_id):
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
+        quantity = cart_item.quantity
         if 'quantity' in data:
             quantity = int(data['quantity'])
             if quantity <= 0:
                 db.session.delete(cart_item)
+                release(user.id, [cart_item.product_id])
             else:
                 cart_item.quantity = quantity
+                reserve(user.id, cart_item.product_id, quantity)
         
         if 'custom_image_url' in data:
             cart_item.custom_image_url = data['custom_image_url']
@@ -108,6 +125,9 @@ def update_cart_item(item_id):
             return jsonify({'message': 'Item removed from cart'}), 200
         else:
             return jsonify(cart_item.to_dict()), 200
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({'error': 'Not enough stock', 'product_id': e.product_id, 'available': e.available}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -124,6 +144,7 @@ def remove_from_cart(item_id):
             return jsonify({'error': 'Cart item not found'}), 404
         
         db.session.delete(cart_item)
+        release(user.id, [cart_item.product_id])
         db.session.commit()
         return jsonify({'message': 'Item removed from cart'}), 200
     except Exception as e:
@@ -138,6 +159,7 @@ def clear_cart():
             return jsonify({'error': 'Authentication required'}), 401
         
         CartItem.query.filter_by(user_id=user.id).delete()
+        release(user.id)
         db.session.commit()
         return jsonify({'message': 'Cart cleared'}), 200
     except Exception as e:
@@ -156,14 +178,20 @@ def checkout():
             return jsonify({'error': 'Shipping address is required'}), 400
         
         # Get cart items
-        cart_items = CartItem.query.filter_by(user_id=user.id).all()
+        # Inner join so FOR UPDATE can row-lock the products too (PostgreSQL); SQLite
+        # ignores it and serializes from the order INSERT below instead
+        cart_items = CartItem.query.options(
+            joinedload(CartItem.product, innerjoin=True)
+        ).filter_by(user_id=user.id).with_for_update().all()
         if not cart_items:
             return jsonify({'error': 'Cart is empty'}), 400
         
         # Calculate total
         total_amount = 0
+        quantities = {}
         for item in cart_items:
             total_amount += item.product.price * item.quantity
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
         
         # Create order
         order = Order(
@@ -175,26 +203,67 @@ def checkout():
         db.session.add(order)
         db.session.flush()  # Get order ID
         
-        # Create order items
-        for cart_item in cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=cart_item.product_id,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price,
-                custom_image_url=cart_item.custom_image_url,
-                custom_text=cart_item.custom_text
-            )
-            db.session.add(order_item)
+        # Live reservations make this a formality; it matters when a hold has expired
+        available = available_stock(list(quantities), user.id)
+        for product_id, quantity in quantities.items():
+            if quantity > available.get(product_id, 0):
+                raise InsufficientStock(product_id, available.get(product_id, 0))
+        
+        # Create order items in one executemany rather than an INSERT per line;
+        # render_nulls keeps lines with and without custom fields in the same batch
+        order_id = order.id
+        db.session.execute(db.insert(OrderItem).execution_options(render_nulls=True), [
+            {
+                'order_id': order_id,
+                'product_id': cart_item.product_id,
+                'quantity': cart_item.quantity,
+                'price': cart_item.product.price,
+                'custom_image_url': cart_item.custom_image_url,
+                'custom_text': cart_item.custom_text,
+                # Snapshot from the products joined in above; no extra reads
+                'product_name': cart_item.product.name,
+                'product_category': cart_item.product.category,
+                'product_image_url': cart_item.product.image_url
+            }
+            for cart_item in cart_items
+        ])
+        
+        # Convert the reservations: take the stock, then drop the holds
+        products = Product.__table__
+        last_seq = next_change_seq(db.session.connection(), len(quantities))
+        db.session.execute(
+            products.update()
+            .where(products.c.id == db.bindparam('reserved_product_id'))
+            .values(
+                stock_quantity=products.c.stock_quantity - db.bindparam('reserved_quantity'),
+                # Bypasses the ORM, so bump the version and feed position by hand
+                version_id=products.c.version_id + 1,
+                change_seq=db.bindparam('reserved_change_seq')
+            ),
+            [
+                {'reserved_product_id': product_id, 'reserved_quantity': quantity,
+                 'reserved_change_seq': last_seq - len(quantities) + offset + 1}
+                for offset, (product_id, quantity) in enumerate(quantities.items())
+            ]
+        )
+        release(user.id)
         
         # Clear cart
         CartItem.query.filter_by(user_id=user.id).delete()
         
         db.session.commit()
+        
+        # The customer's next reads (order list, cart) must see this order
+        use_primary(seconds=current_app.config['READ_YOUR_WRITES_SECONDS'])
+        order = Order.query.options(load_order_details()).filter_by(id=order_id).first()
+        publish_order(order)
         return jsonify({
             'message': 'Order placed successfully',
             'order': order.to_dict()
         }), 201
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({'error': 'Not enough stock', 'product_id': e.product_id, 'available': e.available}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -206,11 +275,23 @@ def get_orders():
         if not user:
             return jsonify({'error': 'Authentication required'}), 401
         
-        orders = Order.query.filter_by(user_id=user.id).order_by(Order.created_at.desc()).all()
+        orders = user_orders(user.id)
         return jsonify([order.to_dict() for order in orders]), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@cart_bp.route('/orders/stream', methods=['GET'])
+def stream_orders():
+    """Server-sent events with {order_id, status, updated_at} whenever one of the user's orders changes"""
+    try:
+        user = require_auth()
+        if not user:
+            return jsonify({'error': 'Authentication required'}), 401
+        
+        return stream_response([user_orders_topic(user.id)])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @cart_bp.route('/orders/<int:order_id>', methods=['GET'])
 def get_order(order_id):
     try:
@@ -218,7 +299,7 @@ def get_order(order_id):
         if not user:
             return jsonify({'error': 'Authentication required'}), 401
         
-        order = Order.query.filter_by(id=order_id, user_id=user.id).first()
+        order = find_order(order_id, user_id=user.id)
         if not order:
             return jsonify({'error': 'Order not found'}), 404
         
@@ -1,10 +1,16 @@
 from flask import Blueprint, request, jsonify
 from src.models.user import db
 from src.models.product import Product
+from src.utils.versioning import InvalidVersion, requested_versions, version_conflict
+from sqlalchemy.orm.exc import StaleDataError
 import os
 
 product_bp = Blueprint('product', __name__)
 
+# Change feed page sizes
+CHANGE_FEED_LIMIT = 100
+CHANGE_FEED_MAX_LIMIT = 1000
+
 @product_bp.route('/products', methods=['GET'])
 def get_products():
     try:
@@ -24,6 +30,29 @@ def get_products():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@product_bp.route('/products/changes', methods=['GET'])
+def get_product_changes():
+    """Products created, updated or soft-deleted after the `since` cursor, oldest change first"""
+    try:
+        since = request.args.get('since', 0, type=int)
+        limit = min(max(request.args.get('limit', CHANGE_FEED_LIMIT, type=int), 1), CHANGE_FEED_MAX_LIMIT)
+        
+        # One row past the page tells us whether there is more, via the change_seq index
+        products = Product.query.filter(Product.change_seq > since).order_by(Product.change_seq).limit(limit + 1).all()
+        has_more = len(products) > limit
+        products = products[:limit]
+        
+        return jsonify({
+            'changes': [
+                dict(product.to_dict(), change_seq=product.change_seq, deleted=not product.is_active)
+                for product in products
+            ],
+            'cursor': products[-1].change_seq if products else since,
+            'has_more': has_more
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @product_bp.route('/products/<int:product_id>', methods=['GET'])
 def get_product(product_id):
     try:
@@ -69,6 +98,10 @@ def update_product(product_id):
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
+        expected_versions = requested_versions(data)
+        if expected_versions is not None and product.version_id not in expected_versions:
+            return version_conflict(product)
+        
         if 'name' in data:
             product.name = data['name']
         if 'description' in data:
@@ -88,6 +121,12 @@ def update_product(product_id):
         
         db.session.commit()
         return jsonify(product.to_dict()), 200
+    except InvalidVersion as e:
+        return jsonify({'error': str(e)}), 400
+    except StaleDataError:
+        # Another writer committed between our read and our UPDATE
+        db.session.rollback()
+        return version_conflict(db.session.get(Product, product_id))
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -99,6 +138,9 @@ def delete_product(product_id):
         product.is_active = False  # Soft delete
         db.session.commit()
         return jsonify({'message': 'Product deleted successfully'}), 200
+    except StaleDataError:
+        db.session.rollback()
+        return version_conflict(db.session.get(Product, product_id))
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -1,17 +1,38 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, Request, request, jsonify, session, send_file, send_from_directory
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
+from src.utils.images import create_variants, probe_image, render_derivative, IMAGE_VARIANTS
+from src.utils.derivative_cache import DerivativeCache
+from src.utils.image_pool import submit_image_job, ImagePoolBusy, IMAGE_JOB_TIMEOUT
+from src.models.user import db
+from src.models.upload import UploadedFile, UploadReference
+from sqlalchemy.exc import IntegrityError
+from concurrent.futures import as_completed
+import hashlib
+import json
 import os
-import uuid
-from PIL import Image
-import io
+import shutil
+import tempfile
 
 upload_bp = Blueprint('upload', __name__)
+media_bp = Blueprint('media', __name__)
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
 
+# On-demand derivatives (GET /uploads/<name>?w=&h=&fit=)
+DERIVATIVE_CACHE_DIR = os.environ.get(
+    'DERIVATIVE_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'derivatives')
+)
+DERIVATIVE_CACHE_MAX_BYTES = int(os.environ.get('DERIVATIVE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+MAX_DERIVATIVE_SIZE = 2400
+DERIVATIVE_FITS = {'contain', 'cover'}
+
+derivative_cache = DerivativeCache(DERIVATIVE_CACHE_DIR, DERIVATIVE_CACHE_MAX_BYTES)
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -22,34 +43,170 @@ def create_upload_folder():
     os.makedirs(upload_path, exist_ok=True)
     return upload_path
 
-def resize_image(image_data, max_width=1200, max_height=1200, quality=85):
-    """Resize image while maintaining aspect ratio"""
+def variant_filename(base_name, variant):
+    """Full-size rendition keeps the plain name so existing URLs stay valid"""
+    if variant == 'full':
+        return f"{base_name}.jpg"
+    return f"{base_name}_{variant}.jpg"
+
+class UploadTooLarge(Exception):
+    pass
+
+class UploadSpool:
+    """Temp file the multipart parser streams one file part into.
+
+    Bytes are hashed and counted as they arrive from the socket. Past
+    MAX_FILE_SIZE the request is rejected (413) on the spot, without reading
+    the rest of the body; or, when `fail_oversized` is off, the part is
+    emptied and marked too large, the rest of it is counted but not stored,
+    and parsing carries on with the next part. The file is deleted when the
+    request closes it.
+    """
+
+    def __init__(self, fail_oversized=True):
+        self.file = tempfile.NamedTemporaryFile(prefix='upload-')
+        self.name = self.file.name
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.fail_oversized = fail_oversized
+        self.too_large = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > MAX_FILE_SIZE:
+            if self.fail_oversized:
+                raise RequestEntityTooLarge('File too large. Maximum size is 16MB')
+            if not self.too_large:
+                self.too_large = True
+                self.file.truncate(0)  # Give the disk space back
+            return len(data)
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+class UploadRequest(Request):
+    """Request whose file parts go straight into UploadSpools (installed when uploads are enabled)"""
+
+    # Set to False before touching request.files to report oversized parts per file instead
+    fail_oversized_files = True
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        spool = UploadSpool(self.fail_oversized_files)
+        self.__dict__.setdefault('upload_spools', []).append(spool)
+        return spool
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            # Also covers spools of a body abandoned mid-parse
+            for spool in self.__dict__.get('upload_spools', ()):
+                spool.close()
+
+def spooled_upload(file):
+    """(temp path, SHA-256 hex digest) of a file part parsed into an UploadSpool"""
+    spool = file.stream
+    if spool.too_large:
+        raise UploadTooLarge('File too large. Maximum size is 16MB')
+    spool.flush()  # The image pool reads it by path from another process
+    return spool.name, spool.digest.hexdigest()
+
+def write_file_atomic(path, data):
+    """Write via a temp file so concurrent writers of the same content never expose a partial file"""
+    temp_path = f"{path}.tmp-{os.getpid()}"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def save_upload(source_path, file_extension, base_name):
+    """Process an uploaded image and write it (and its renditions) to the upload folder"""
+    upload_path = create_upload_folder()
+
+    renditions = {}
+    if file_extension in ['jpg', 'jpeg', 'png', 'webp']:
+        try:
+            # Pillow reads lazily from the spooled file; no full copy of the upload in memory
+            renditions = create_variants(source_path)
+        except Exception as e:
+            print(f"Error creating image variants: {e}")
+
+    if not renditions:
+        # Store as-is (e.g. animated GIFs, or images Pillow could not process)
+        unique_filename = f"{base_name}.{file_extension}"
+        file_path = os.path.join(upload_path, unique_filename)
+        temp_path = f"{file_path}.tmp-{os.getpid()}"
+        shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, file_path)
+        return {
+            'filename': unique_filename,
+            'url': f"/{UPLOAD_FOLDER}/{unique_filename}",
+            'size': os.path.getsize(file_path),
+            'variants': {}
+        }
+
+    variants = {}
+    for variant, data in renditions.items():
+        filename = variant_filename(base_name, variant)
+        write_file_atomic(os.path.join(upload_path, filename), data)
+        variants[variant] = f"/{UPLOAD_FOLDER}/{filename}"
+
+    unique_filename = variant_filename(base_name, 'full')
+    return {
+        'filename': unique_filename,
+        'url': variants['full'],
+        'size': len(renditions['full']),
+        'variants': variants
+    }
+
+def claim_existing_upload(content_hash, user_id):
+    """Take a reference for `user_id` on an already stored upload, or return None if there is none"""
+    record = UploadedFile.query.filter_by(content_hash=content_hash).first()
+    if not record:
+        return None
+    if UploadReference.query.filter_by(upload_id=record.id, user_id=user_id).first():
+        return record.to_dict()  # A user holds at most one reference per file
+
+    # Atomic increment; zero rows means a concurrent delete just released the last reference
+    claimed = UploadedFile.query.filter_by(id=record.id).update(
+        {'ref_count': UploadedFile.ref_count + 1}, synchronize_session=False
+    )
+    if not claimed:
+        db.session.rollback()
+        return None
     try:
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Convert RGBA to RGB if necessary
-        if image.mode in ('RGBA', 'LA', 'P'):
-            background = Image.new('RGB', image.size, (255, 255, 255))
-            if image.mode == 'P':
-                image = image.convert('RGBA')
-            background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-            image = background
-        
-        # Calculate new dimensions
-        width, height = image.size
-        if width > max_width or height > max_height:
-            ratio = min(max_width / width, max_height / height)
-            new_width = int(width * ratio)
-            new_height = int(height * ratio)
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        
-        # Save to bytes
-        output = io.BytesIO()
-        image.save(output, format='JPEG', quality=quality, optimize=True)
-        return output.getvalue()
-    except Exception as e:
-        print(f"Error resizing image: {e}")
-        return image_data
+        db.session.add(UploadReference(upload_id=record.id, user_id=user_id))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()  # The same user claimed it concurrently; undoes our increment too
+    return record.to_dict()
+
+def register_upload(content_hash, saved, user_id):
+    """Record a freshly processed upload owned by `user_id`, folding into an existing record if another request won the race"""
+    try:
+        record = UploadedFile(
+            content_hash=content_hash,
+            filename=saved['filename'],
+            size=saved['size'],
+            variants=json.dumps(saved['variants'])
+        )
+        db.session.add(record)
+        db.session.flush()
+        db.session.add(UploadReference(upload_id=record.id, user_id=user_id))
+        db.session.commit()
+        return record.to_dict()
+    except IntegrityError:
+        db.session.rollback()
+        return claim_existing_upload(content_hash, user_id) or saved
+
+def remove_upload_files(upload_path, filename):
+    base_name = filename.rsplit('.', 1)[0]
+    paths = [os.path.join(upload_path, filename)]
+    paths += [os.path.join(upload_path, variant_filename(base_name, variant)) for variant in IMAGE_VARIANTS]
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
 
 @upload_bp.route('/upload', methods=['POST'])
 def upload_file():
@@ -67,47 +224,42 @@ def upload_file():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Check file size
-        file.seek(0, os.SEEK_END)
-        file_size = file.tell()
-        file.seek(0)
-        
-        if file_size > MAX_FILE_SIZE:
-            return jsonify({'error': 'File too large. Maximum size is 16MB'}), 400
-        
         if file and allowed_file(file.filename):
-            # Create upload folder
-            upload_path = create_upload_folder()
+            # Already on disk: the parser spooled and hashed it as the body arrived
+            spool_path, content_hash = spooled_upload(file)
             
-            # Generate unique filename
-            file_extension = file.filename.rsplit('.', 1)[1].lower()
-            unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
-            
-            # Read and process image
-            file_data = file.read()
-            
-            # Resize image if it's too large
-            if file_extension in ['jpg', 'jpeg', 'png', 'webp']:
-                file_data = resize_image(file_data)
-                unique_filename = f"{uuid.uuid4().hex}.jpg"  # Convert to JPEG
+            # Check the header before paying for a full decode
+            try:
+                file_extension = probe_image(spool_path)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
-            # Save file
-            file_path = os.path.join(upload_path, unique_filename)
-            with open(file_path, 'wb') as f:
-                f.write(file_data)
+            # Identical bytes were uploaded before: reuse them without reprocessing
+            existing = claim_existing_upload(content_hash, user_id)
+            if existing:
+                return jsonify({
+                    'success': True,
+                    'deduplicated': True,
+                    **existing
+                }), 200
             
-            # Return URL relative to static folder
-            file_url = f"/{UPLOAD_FOLDER}/{unique_filename}"
+            # Resize and save in the image pool so the web worker stays free
+            try:
+                future = submit_image_job(save_upload, spool_path, file_extension, content_hash)
+            except ImagePoolBusy as e:
+                return jsonify({'error': str(e)}), 503
+            saved = register_upload(content_hash, future.result(timeout=IMAGE_JOB_TIMEOUT), user_id)
             
             return jsonify({
                 'success': True,
-                'filename': unique_filename,
-                'url': file_url,
-                'size': len(file_data)
+                'deduplicated': False,
+                **saved
             }), 200
         
         return jsonify({'error': 'Invalid file type. Allowed types: PNG, JPG, JPEG, GIF, WEBP'}), 400
         
+    except RequestEntityTooLarge as e:
+        return jsonify({'error': e.description}), 413
     except Exception as e:
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
@@ -119,69 +271,83 @@ def upload_multiple_files():
         if not user_id:
             return jsonify({'error': 'Authentication required'}), 401
         
+        # One oversized file gets its own error below instead of failing the batch
+        request.fail_oversized_files = False
         files = request.files.getlist('files')
         if not files:
             return jsonify({'error': 'No files provided'}), 400
         
         uploaded_files = []
         errors = []
+        pending = {}  # future -> (content hash, [original names])
+        pending_by_hash = {}
         
         for file in files:
             if file.filename == '':
                 continue
                 
             try:
-                # Check file size
-                file.seek(0, os.SEEK_END)
-                file_size = file.tell()
-                file.seek(0)
-                
-                if file_size > MAX_FILE_SIZE:
-                    errors.append(f'{file.filename}: File too large')
-                    continue
-                
                 if allowed_file(file.filename):
-                    # Create upload folder
-                    upload_path = create_upload_folder()
-                    
-                    # Generate unique filename
-                    file_extension = file.filename.rsplit('.', 1)[1].lower()
-                    unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
+                    # Already on disk: the parser spooled and hashed it as the body arrived
+                    spool_path, content_hash = spooled_upload(file)
                     
-                    # Read and process image
-                    file_data = file.read()
+                    # Check the header before paying for a full decode
+                    file_extension = probe_image(spool_path)
                     
-                    # Resize image if it's too large
-                    if file_extension in ['jpg', 'jpeg', 'png', 'webp']:
-                        file_data = resize_image(file_data)
-                        unique_filename = f"{uuid.uuid4().hex}.jpg"  # Convert to JPEG
+                    # Same bytes earlier in this batch: share that file's processing
+                    if content_hash in pending_by_hash:
+                        pending[pending_by_hash[content_hash]][1].append(file.filename)
+                        continue
                     
-                    # Save file
-                    file_path = os.path.join(upload_path, unique_filename)
-                    with open(file_path, 'wb') as f:
-                        f.write(file_data)
+                    existing = claim_existing_upload(content_hash, user_id)
+                    if existing:
+                        uploaded_files.append({
+                            'original_name': file.filename,
+                            'deduplicated': True,
+                            **existing
+                        })
+                        continue
                     
-                    # Return URL relative to static folder
-                    file_url = f"/{UPLOAD_FOLDER}/{unique_filename}"
-                    
-                    uploaded_files.append({
-                        'original_name': file.filename,
-                        'filename': unique_filename,
-                        'url': file_url,
-                        'size': len(file_data)
-                    })
+                    # Dispatch to the image pool; blocks while the pool is saturated
+                    future = submit_image_job(save_upload, spool_path, file_extension, content_hash)
+                    pending[future] = (content_hash, [file.filename])
+                    pending_by_hash[content_hash] = future
                 else:
                     errors.append(f'{file.filename}: Invalid file type')
                     
+            except UploadTooLarge:
+                errors.append(f'{file.filename}: File too large')
             except Exception as e:
                 errors.append(f'{file.filename}: {str(e)}')
         
+        # Collect results as each file finishes processing
+        try:
+            for future in as_completed(pending, timeout=IMAGE_JOB_TIMEOUT):
+                content_hash, filenames = pending[future]
+                try:
+                    saved = future.result()
+                    for index, filename in enumerate(filenames):
+                        record = register_upload(content_hash, saved, user_id) if index == 0 else claim_existing_upload(content_hash, user_id)
+                        uploaded_files.append({
+                            'original_name': filename,
+                            'deduplicated': index > 0,
+                            **(record or saved)
+                        })
+                except Exception as e:
+                    errors.extend(f'{filename}: {str(e)}' for filename in filenames)
+        except TimeoutError:
+            for future, (content_hash, filenames) in pending.items():
+                if not future.done():
+                    errors.extend(f'{filename}: Processing timed out' for filename in filenames)
+        
         return jsonify({
             'success': True,
             'uploaded_files': uploaded_files,
             'errors': errors
         }), 200
         
+    except RequestEntityTooLarge as e:
+        return jsonify({'error': e.description}), 413
     except Exception as e:
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
@@ -198,13 +364,90 @@ def delete_file(filename):
         upload_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', UPLOAD_FOLDER)
         file_path = os.path.join(upload_path, secure_name)
         
-        # Check if file exists and delete it
+        # Deduplicated uploads are shared: release this user's reference, delete bytes with the last
+        record = UploadedFile.query.filter_by(filename=secure_name).first()
+        if record:
+            released = UploadReference.query.filter_by(
+                upload_id=record.id, user_id=user_id
+            ).delete(synchronize_session=False)
+            if not released:
+                db.session.rollback()
+                return jsonify({'error': 'File not found'}), 404  # Someone else's, or already deleted
+            
+            UploadedFile.query.filter_by(id=record.id).update(
+                {'ref_count': UploadedFile.ref_count - 1}, synchronize_session=False
+            )
+            removed = UploadedFile.query.filter(
+                UploadedFile.id == record.id, UploadedFile.ref_count <= 0
+            ).delete(synchronize_session=False)
+            if removed:
+                # Unlink before committing, while the row is still locked: a concurrent claim waits
+                # and then misses, so any upload that rewrites these files happens after this
+                remove_upload_files(upload_path, secure_name)
+            db.session.commit()
+            return jsonify({'success': True, 'message': 'File deleted successfully'}), 200
+        
+        # Check if file exists and delete it along with its renditions
         if os.path.exists(file_path):
-            os.remove(file_path)
+            remove_upload_files(upload_path, secure_name)
             return jsonify({'success': True, 'message': 'File deleted successfully'}), 200
         else:
             return jsonify({'error': 'File not found'}), 404
             
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Delete failed: {str(e)}'}), 500
 
+
+def accepts_webp():
+    """Only an explicit image/webp entry counts; a bare */* gets JPEG"""
+    return any(mimetype == 'image/webp' and quality > 0 for mimetype, quality in request.accept_mimetypes)
+
+@media_bp.route('/uploads/<name>', methods=['GET'])
+def get_upload(name):
+    try:
+        secure_name = secure_filename(name)
+        upload_path = create_upload_folder()
+        source_path = os.path.join(upload_path, secure_name)
+        if not secure_name or not os.path.isfile(source_path):
+            return jsonify({'error': 'File not found'}), 404
+        
+        width = request.args.get('w', type=int)
+        height = request.args.get('h', type=int)
+        fit = request.args.get('fit', 'contain')
+        
+        # No size requested: serve the stored file itself
+        if not width and not height:
+            return send_from_directory(upload_path, secure_name, max_age=86400)
+        
+        if fit not in DERIVATIVE_FITS:
+            return jsonify({'error': 'Invalid fit. Allowed values: contain, cover'}), 400
+        if any(value is not None and not 0 < value <= MAX_DERIVATIVE_SIZE for value in (width, height)):
+            return jsonify({'error': f'Width and height must be between 1 and {MAX_DERIVATIVE_SIZE}'}), 400
+        if fit == 'cover' and not (width and height):
+            return jsonify({'error': 'fit=cover requires both w and h'}), 400
+        
+        width = width or MAX_DERIVATIVE_SIZE
+        height = height or MAX_DERIVATIVE_SIZE
+        output_format = 'webp' if accepts_webp() else 'jpeg'
+        
+        # Stored uploads never change in place, so the name fully identifies the source
+        base_name = secure_name.rsplit('.', 1)[0]
+        extension = 'webp' if output_format == 'webp' else 'jpg'
+        key = f"{base_name}-{width}x{height}-{fit}.{extension}"
+        
+        def render():
+            future = submit_image_job(render_derivative, source_path, width, height, fit, output_format)
+            return future.result(timeout=IMAGE_JOB_TIMEOUT)
+        
+        try:
+            derivative_path = derivative_cache.get_or_create(key, render)
+        except ImagePoolBusy as e:
+            return jsonify({'error': str(e)}), 503
+        
+        response = send_file(derivative_path, mimetype=f'image/{output_format}', max_age=86400)
+        response.vary.add('Accept')
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': f'Resize failed: {str(e)}'}), 500
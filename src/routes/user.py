@@ -13,6 +13,7 @@ def create_user():
     
     data = request.json
     user = User(username=data['username'], email=data['email'])
+    user.set_password(data['password'])  # password_hash is NOT NULL
     db.session.add(user)
     db.session.commit()
     return jsonify(user.to_dict()), 201
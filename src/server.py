@@ -0,0 +1,266 @@
+"""Pre-forking production server.
+
+    python -m src.server --workers 4 --port 5000 --max-requests 10000
+
+The master imports and builds the app once, binds the listening socket and
+forks the workers, so imported code and the static manifest are shared
+copy-on-write. Each worker serves with Werkzeug's threaded WSGI server on the
+shared socket. The master restarts workers that exit, e.g. after
+--max-requests.
+
+Signals to the master:
+    SIGTERM / SIGINT  stop; workers finish in-flight requests first
+    SIGHUP            graceful reload: re-exec the master with the same
+                      socket, start fresh workers on the new code, then
+                      drain and stop the old ones
+"""
+import os
+import sys
+# Allow `python src/server.py` as well as `python -m src.server`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import gc
+import random
+import signal
+import socket
+import threading
+import time
+from werkzeug.serving import make_server
+
+LISTEN_FD_ENV = 'PREFORK_LISTEN_FD'
+OLD_WORKERS_ENV = 'PREFORK_OLD_WORKERS'
+
+class ResponseTracker:
+    """Wraps a WSGI response body and reports once the server has finished sending it"""
+
+    def __init__(self, app_iter, on_close):
+        self.app_iter = app_iter
+        self.on_close = on_close
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.app_iter)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if hasattr(self.app_iter, 'close'):
+                self.app_iter.close()
+        finally:
+            self.on_close()
+
+class Worker:
+    """Runs inside a forked child: serve until told to stop or the request limit is hit"""
+
+    def __init__(self, app, sock, max_requests, graceful_timeout):
+        self.app = app
+        self.sock = sock
+        self.max_requests = max_requests
+        self.graceful_timeout = graceful_timeout
+        self.handled = 0
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.server = None
+        self.stopping = False
+
+    def __call__(self, environ, start_response):
+        with self.lock:
+            self.in_flight += 1
+            self.handled += 1
+            limit_reached = self.max_requests and self.handled >= self.max_requests
+        try:
+            app_iter = self.app(environ, start_response)
+        except BaseException:
+            self.request_finished(limit_reached)
+            raise
+        # Werkzeug writes the body after we return and calls close() once it is sent
+        return ResponseTracker(app_iter, lambda: self.request_finished(limit_reached))
+
+    def request_finished(self, limit_reached):
+        with self.lock:
+            self.in_flight -= 1
+        if limit_reached:
+            self.stop()
+
+    def stop(self, *_):
+        if self.stopping:
+            return
+        self.stopping = True
+        # shutdown() blocks until serve_forever exits, so never call it from the serving thread
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+        # Connections inherited from the master must not be shared across processes
+        from src.models.user import db
+        with self.app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+        # Every worker sweeps; the deletes are idempotent and cheap when nothing has expired
+        from src.utils.reservations import start_reservation_sweeper
+        start_reservation_sweeper(self.app)
+
+        host, port = self.sock.getsockname()[:2]
+        self.server = make_server(host, port, self, threaded=True, fd=self.sock.fileno())
+        self.server.serve_forever()
+
+        # Handler threads are daemons, so wait until every response body has been
+        # sent (or graceful_timeout passes, e.g. for never-ending event streams)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.in_flight and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+class Master:
+    def __init__(self, app, sock, workers, max_requests, max_requests_jitter, graceful_timeout):
+        self.app = app
+        self.sock = sock
+        self.worker_count = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.workers = {}  # pid -> slot number
+        self.running = True
+        self.reload_requested = False
+
+    def spawn(self, slot):
+        # Jitter keeps workers from all recycling at the same moment
+        max_requests = self.max_requests
+        if max_requests and self.max_requests_jitter:
+            max_requests += random.randint(0, self.max_requests_jitter)
+
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                Worker(self.app, self.sock, max_requests, self.graceful_timeout).run()
+            except Exception as e:
+                print(f"[worker {os.getpid()}] crashed: {e}", file=sys.stderr)
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self.workers[pid] = slot
+
+    def reap(self):
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.workers.pop(pid, None)
+
+    def stop_workers(self, pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def wait_for_exit(self, pids):
+        deadline = time.monotonic() + self.graceful_timeout + 1
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            for pid in list(remaining):
+                try:
+                    finished, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    finished = pid
+                if finished:
+                    remaining.discard(pid)
+                    self.workers.pop(pid, None)
+            time.sleep(0.05)
+        for pid in remaining:
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+    def handle_stop(self, *_):
+        self.running = False
+
+    def handle_reload(self, *_):
+        self.reload_requested = True
+
+    def reexec(self):
+        """Replace this process with a fresh master that inherits the socket and our workers"""
+        print(f"[master {os.getpid()}] reloading", file=sys.stderr)
+        os.set_inheritable(self.sock.fileno(), True)
+        os.environ[LISTEN_FD_ENV] = str(self.sock.fileno())
+        os.environ[OLD_WORKERS_ENV] = ','.join(str(pid) for pid in self.workers)
+        os.execv(sys.executable, [sys.executable, '-m', 'src.server'] + sys.argv[1:])
+
+    def run(self, old_workers=()):
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        signal.signal(signal.SIGHUP, self.handle_reload)
+
+        # Objects created during preload never change; keep the GC from touching
+        # (and so copying) their pages in every worker
+        gc.freeze()
+
+        for slot in range(self.worker_count):
+            self.spawn(slot)
+
+        # After a reload, the previous generation drains once the new one is up
+        if old_workers:
+            self.stop_workers(old_workers)
+
+        host, port = self.sock.getsockname()[:2]
+        print(f"[master {os.getpid()}] serving on http://{host}:{port} with {self.worker_count} workers", file=sys.stderr)
+
+        while self.running:
+            self.reap()
+            if self.reload_requested:
+                self.reexec()
+            active_slots = set(self.workers.values())
+            for slot in range(self.worker_count):
+                if slot not in active_slots:
+                    self.spawn(slot)
+            time.sleep(0.2)
+
+        pids = list(self.workers)
+        self.stop_workers(pids)
+        self.wait_for_exit(pids)
+        self.sock.close()
+
+def bind_socket(host, port, backlog=2048):
+    inherited_fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if inherited_fd:
+        return socket.socket(fileno=int(inherited_fd))
+
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-forking production server')
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)))
+    parser.add_argument('--max-requests', type=int, default=10000, help='Recycle a worker after this many requests (0 = never)')
+    parser.add_argument('--max-requests-jitter', type=int, default=1000)
+    parser.add_argument('--graceful-timeout', type=float, default=30, help='Seconds workers get to finish in-flight requests')
+    args = parser.parse_args()
+
+    old_workers = [int(pid) for pid in os.environ.pop(OLD_WORKERS_ENV, '').split(',') if pid]
+    sock = bind_socket(args.host, args.port)
+
+    # Preload: import every module and build the app (and its static manifest) once
+    from src.main import app
+
+    master = Master(app, sock, args.workers, args.max_requests, args.max_requests_jitter, args.graceful_timeout)
+    master.run(old_workers)
+
+if __name__ == '__main__':
+    main()
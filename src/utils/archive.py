@@ -0,0 +1,116 @@
+"""Hot/cold order storage.
+
+`flask archive-orders` moves delivered and cancelled orders that have not
+changed for ORDER_ARCHIVE_DAYS out of `orders`/`order_items` into
+`archived_orders`/`archived_order_items`, keeping their ids. The read
+helpers below look in both tiers, so routes return archived orders exactly
+as before while the hot tables stay small.
+"""
+from datetime import datetime, timedelta
+from math import ceil
+from src.models.user import db
+from src.models.product import (
+    Order, OrderItem, ArchivedOrder, ArchivedOrderItem, load_order_details, load_archived_order_details
+)
+
+ARCHIVABLE_STATUSES = ('delivered', 'cancelled')  # Final states; nothing updates these orders again
+
+def archive_orders(older_than_days, batch_size=1000, echo=print):
+    """Move final orders not updated for `older_than_days` days to the archive; returns orders moved.
+
+    Each batch is its own transaction (copy, then delete), so the job can be
+    interrupted at any point and writers are never blocked for long.
+    """
+    orders = Order.__table__
+    items = OrderItem.__table__
+    archived_orders = ArchivedOrder.__table__
+    archived_items = ArchivedOrderItem.__table__
+    order_columns = list(orders.c.keys())
+    item_columns = list(items.c.keys())
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+    moved = 0
+    last_id = 0
+    with db.engine.connect() as connection:
+        with connection.begin():
+            # SQLite reuses max(id) + 1, so the newest order always stays hot and ids stay unique across tiers
+            newest_id = connection.execute(db.select(db.func.max(orders.c.id))).scalar() or 0
+
+        while True:
+            with connection.begin():
+                # Walk the primary key instead of re-filtering the whole table every batch
+                ids = connection.execute(
+                    db.select(orders.c.id).where(
+                        orders.c.id > last_id,
+                        orders.c.id < newest_id,
+                        orders.c.status.in_(ARCHIVABLE_STATUSES),
+                        orders.c.updated_at < cutoff
+                    ).order_by(orders.c.id).limit(batch_size)
+                ).scalars().all()
+                if not ids:
+                    break
+
+                connection.execute(archived_orders.insert().from_select(
+                    order_columns + ['archived_at'],
+                    db.select(*[orders.c[name] for name in order_columns], db.literal(datetime.utcnow()))
+                    .where(orders.c.id.in_(ids))
+                ))
+                connection.execute(archived_items.insert().from_select(
+                    item_columns,
+                    db.select(*[items.c[name] for name in item_columns]).where(items.c.order_id.in_(ids))
+                ))
+                connection.execute(items.delete().where(items.c.order_id.in_(ids)))
+                connection.execute(orders.delete().where(orders.c.id.in_(ids)))
+
+            moved += len(ids)
+            last_id = ids[-1]
+            echo(f'archived {moved} orders')
+    return moved
+
+def find_order(order_id, user_id=None):
+    """Order by id from the hot table, else the archive; None if it is in neither"""
+    for model, loader in ((Order, load_order_details), (ArchivedOrder, load_archived_order_details)):
+        query = model.query.options(loader()).filter_by(id=order_id)
+        if user_id is not None:
+            query = query.filter_by(user_id=user_id)
+        order = query.first()
+        if order:
+            return order
+    return None
+
+def user_orders(user_id):
+    """All of a user's orders from both tiers, newest first"""
+    orders = Order.query.options(load_order_details()).filter_by(user_id=user_id).all()
+    orders += ArchivedOrder.query.options(load_archived_order_details()).filter_by(user_id=user_id).all()
+    return sorted(orders, key=lambda order: order.created_at or datetime.min, reverse=True)
+
+def paginate_orders(page, per_page, status=''):
+    """One page of orders from both tiers, newest first; returns (orders, total, pages)"""
+    page = max(page, 1)
+    per_page = max(per_page, 1)
+
+    hot = db.select(Order.id, Order.created_at, db.literal(False).label('archived'))
+    cold = db.select(ArchivedOrder.id, ArchivedOrder.created_at, db.literal(True).label('archived'))
+    if status:
+        hot = hot.where(Order.status == status)
+        cold = cold.where(ArchivedOrder.status == status)
+    if status and status not in ARCHIVABLE_STATUSES:
+        both = hot.subquery()  # Open orders are never archived
+    else:
+        both = db.union_all(hot, cold).subquery()
+
+    total = db.session.execute(db.select(db.func.count()).select_from(both)).scalar()
+    rows = db.session.execute(
+        db.select(both).order_by(both.c.created_at.desc(), both.c.id.desc())
+        .limit(per_page).offset((page - 1) * per_page)
+    ).all()
+
+    # Load the page's orders with their lines from whichever tier holds them
+    loaded = {}
+    for archived, model, loader in ((False, Order, load_order_details), (True, ArchivedOrder, load_archived_order_details)):
+        ids = [row.id for row in rows if bool(row.archived) == archived]
+        if ids:
+            for order in model.query.options(loader()).filter(model.id.in_(ids)):
+                loaded[(archived, order.id)] = order
+    orders = [loaded[(bool(row.archived), row.id)] for row in rows]
+    return orders, total, ceil(total / per_page)
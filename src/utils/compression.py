@@ -0,0 +1,57 @@
+from flask import current_app, request
+import gzip
+
+DEFAULT_COMPRESS_MIMETYPES = [
+    'application/json',
+    'text/html',
+    'text/plain',
+    'text/css',
+    'text/csv',
+    'text/javascript',
+    'application/javascript',
+    'image/svg+xml',
+]
+
+def init_compression(app):
+    """Gzip eligible responses after each request.
+
+    COMPRESS_LEVEL (1-9), COMPRESS_MIN_SIZE (bytes) and COMPRESS_MIMETYPES can be
+    overridden in app.config before this is called.
+    """
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_COMPRESS_MIMETYPES)
+    app.after_request(compress_response)
+
+def compress_response(response):
+    config = current_app.config
+
+    if response.mimetype not in config['COMPRESS_MIMETYPES']:
+        return response
+
+    # File and streaming responses are never buffered here; pre-encoded bodies are left alone
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    if 'Content-Encoding' in response.headers or 'no-transform' in response.headers.get('Cache-Control', ''):
+        return response
+    if not 200 <= response.status_code < 300 or response.status_code == 204 or request.method == 'HEAD':
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if request.accept_encodings['gzip'] <= 0:
+        return response
+
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    compressed = gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+    if len(compressed) >= len(data):
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = 'gzip'
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-gz", weak=weak)
+    return response
@@ -0,0 +1,26 @@
+from sqlalchemy import event
+from src.models.user import db
+from src.models.routing import REPLICA_BIND
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+def init_engine_events(app):
+    """Apply SQLITE_PRAGMAS to each new connection on the app's SQLite engines"""
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    if not pragmas:
+        return
+
+    # A read-only connection cannot switch the journal mode; it follows the primary's WAL
+    read_pragmas = {name: value for name, value in pragmas.items() if name != 'journal_mode'}
+
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            if engine.dialect.name == 'sqlite':
+                engine_pragmas = read_pragmas if bind_key == REPLICA_BIND else pragmas
+                event.listen(engine, 'connect', lambda dbapi_connection, _, engine_pragmas=engine_pragmas: apply_sqlite_pragmas(dbapi_connection, engine_pragmas))
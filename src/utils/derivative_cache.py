@@ -0,0 +1,97 @@
+import os
+import threading
+
+class DerivativeCache:
+    """Size-capped on-disk LRU cache for rendered image derivatives.
+
+    Hits refresh the file's mtime, and eviction removes the least recently
+    used files once the directory grows past `max_bytes`. Concurrent requests
+    for the same key within this process share a single render.
+    """
+
+    def __init__(self, directory, max_bytes, wait_timeout=30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._total = None
+
+    def get_or_create(self, key, render):
+        """Return the path for `key`, calling `render()` for its bytes on a miss"""
+        path = os.path.join(self.directory, key)
+        if self._touch(path):
+            return path
+
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+
+        if not leader:
+            # Someone else is already rendering this derivative; wait for their file
+            event.wait(self.wait_timeout)
+            if self._touch(path):
+                return path
+            return self._store(path, render())
+
+        try:
+            return self._store(path, render())
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _store(self, path, data):
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan()[1]
+            else:
+                self._total += len(data)
+            over_budget = self._total > self.max_bytes
+
+        if over_budget:
+            self._evict(keep=path)
+        return path
+
+    def _scan(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and '.tmp-' not in entry.name:
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        return entries, total
+
+    def _evict(self, keep=None):
+        """Drop least recently used files until the cache is back under 90% of its cap"""
+        with self._lock:
+            entries, total = self._scan()
+            entries.sort()
+            target = self.max_bytes * 0.9
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+            self._total = total
@@ -0,0 +1,66 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import os
+import threading
+
+# Configuration
+IMAGE_POOL_WORKERS = int(os.environ.get('IMAGE_POOL_WORKERS', os.cpu_count() or 1))
+IMAGE_POOL_MAX_PENDING = int(os.environ.get('IMAGE_POOL_MAX_PENDING', IMAGE_POOL_WORKERS * 2))
+IMAGE_POOL_WAIT = float(os.environ.get('IMAGE_POOL_WAIT', 10))  # Seconds to wait for a free slot
+IMAGE_JOB_TIMEOUT = float(os.environ.get('IMAGE_JOB_TIMEOUT', 60))
+
+class ImagePoolBusy(Exception):
+    """Raised when every pool slot stays taken for longer than IMAGE_POOL_WAIT"""
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(IMAGE_POOL_MAX_PENDING)
+
+def get_executor():
+    """Create the process pool on first use so importing this module stays cheap"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=IMAGE_POOL_WORKERS)
+        return _executor
+
+def _discard_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def submit_image_job(fn, *args):
+    """Run `fn(*args)` in the image pool and return its future.
+
+    At most IMAGE_POOL_MAX_PENDING jobs are queued or running at once; callers
+    block for a free slot and get ImagePoolBusy if none frees up in time, so a
+    burst of uploads cannot pile unbounded work (and memory) onto the pool.
+    """
+    if not _slots.acquire(timeout=IMAGE_POOL_WAIT):
+        raise ImagePoolBusy('Image processing is busy, please try again shortly')
+
+    try:
+        executor = get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool and retry once
+            _discard_executor(executor)
+            future = get_executor().submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+def _reset_after_fork():
+    # A forked child must not reuse its parent's pool handles or lock state
+    global _executor, _executor_lock, _slots
+    _executor = None
+    _executor_lock = threading.Lock()
+    _slots = threading.BoundedSemaphore(IMAGE_POOL_MAX_PENDING)
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,135 @@
+from PIL import Image
+import io
+
+# Renditions produced for every uploaded photo, as (max_width, max_height)
+IMAGE_VARIANTS = {
+    'thumb': (200, 200),
+    'card': (600, 600),
+    'full': (1200, 1200),
+}
+
+JPEG_QUALITY = 85
+
+# Formats accepted for upload, mapped to the extension they are stored under
+UPLOAD_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+MAX_IMAGE_PIXELS = 50_000_000  # Refuse anything bigger before decoding it
+
+def probe_image(source):
+    """Read only the image header and return its storage extension.
+
+    Raises ValueError for files that are not a supported image, or whose
+    dimensions would make a full decode unreasonably expensive.
+    """
+    try:
+        with Image.open(source) as image:
+            image_format = image.format
+            width, height = image.size
+    except (OSError, Image.DecompressionBombError, SyntaxError):
+        raise ValueError('File is not a valid image')
+
+    if image_format not in UPLOAD_FORMATS:
+        raise ValueError(f'Unsupported image format: {image_format}')
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ValueError(f'Image dimensions too large: {width}x{height}')
+    return UPLOAD_FORMATS[image_format]
+
+def decode_image(source, target_size=None):
+    """Open and decode an image, letting JPEGs decode straight at a reduced scale.
+
+    `draft()` asks libjpeg for a 1/2, 1/4 or 1/8 scale DCT decode that is still
+    at least `target_size`, which skips most of the decode work for large photos.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    image = Image.open(source)
+    if target_size and image.format == 'JPEG':
+        image.draft('RGB', target_size)
+    image.load()
+    return image
+
+def flatten_image(image):
+    """Convert to RGB for JPEG output, compositing transparency onto white"""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        if image.mode == 'P':
+            image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    if image.mode != 'RGB':
+        return image.convert('RGB')
+    return image
+
+def resize_to_fit(image, max_size):
+    """Return a copy scaled down to fit `max_size`, keeping the aspect ratio.
+
+    `thumbnail()` first shrinks with `reduce()` (cheap box averaging) down to
+    roughly three times the target before the final LANCZOS pass.
+    """
+    resized = image.copy()
+    resized.thumbnail(max_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    return resized
+
+def encode_jpeg(image, quality=JPEG_QUALITY):
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=quality, optimize=True)
+    return output.getvalue()
+
+def encode_webp(image, quality=80):
+    output = io.BytesIO()
+    image.save(output, format='WEBP', quality=quality, method=4)
+    return output.getvalue()
+
+def render_derivative(source, width, height, fit='contain', output_format='jpeg'):
+    """Render one on-demand size of an image.
+
+    `contain` fits inside width x height; `cover` fills it exactly, cropping
+    the overflow around the centre.
+    """
+    image = decode_image(source, (width, height))
+    if output_format == 'webp':
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'P') else 'RGB')
+    else:
+        image = flatten_image(image)
+
+    if fit == 'cover':
+        # Resample only the centred region that survives the crop
+        scale = max(width / image.width, height / image.height)
+        crop_width, crop_height = width / scale, height / scale
+        left = (image.width - crop_width) / 2
+        top = (image.height - crop_height) / 2
+        box = (left, top, left + crop_width, top + crop_height)
+        image = image.resize((width, height), Image.Resampling.LANCZOS, box=box, reducing_gap=3.0)
+    else:
+        image = resize_to_fit(image, (width, height))
+
+    if output_format == 'webp':
+        return encode_webp(image)
+    return encode_jpeg(image)
+
+def create_variants(source, variants=None, quality=JPEG_QUALITY):
+    """Decode once and produce every configured rendition as JPEG bytes.
+
+    Renditions are generated largest first, each one reduced from the previous
+    rendition rather than from the full-size original.
+    """
+    variants = variants or IMAGE_VARIANTS
+    largest = (max(size[0] for size in variants.values()), max(size[1] for size in variants.values()))
+
+    image = flatten_image(decode_image(source, largest))
+
+    renditions = {}
+    for name, size in sorted(variants.items(), key=lambda item: item[1][0] * item[1][1], reverse=True):
+        image = resize_to_fit(image, size)
+        renditions[name] = encode_jpeg(image, quality)
+    return renditions
+
+def resize_image(image_data, max_width=1200, max_height=1200, quality=JPEG_QUALITY):
+    """Resize image while maintaining aspect ratio"""
+    try:
+        image = flatten_image(decode_image(image_data, (max_width, max_height)))
+        image = resize_to_fit(image, (max_width, max_height))
+        return encode_jpeg(image, quality)
+    except Exception as e:
+        print(f"Error resizing image: {e}")
+        return image_data
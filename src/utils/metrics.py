@@ -0,0 +1,155 @@
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+MAX_THREAD_STATS = 256  # Fold finished threads' numbers together beyond this many
+
+class ThreadStats:
+    """Metrics recorded by one thread; only that thread ever writes to it, so no locking"""
+
+    def __init__(self, thread=None):
+        self.thread = thread
+        self.latency = {}  # (endpoint, method, status) -> bucket counts + [count, sum]
+        self.queries = {}  # endpoint -> bucket counts + [count, sum]
+        self.query_seconds = {}  # endpoint -> total seconds spent in SQL
+
+    def merge(self, other):
+        for target, source in ((self.latency, other.latency), (self.queries, other.queries)):
+            for key, values in source.items():
+                current = target.setdefault(key, [0] * len(values))
+                for index, value in enumerate(values):
+                    current[index] += value
+        for key, value in other.query_seconds.items():
+            self.query_seconds[key] = self.query_seconds.get(key, 0) + value
+
+_local = threading.local()
+_registry_lock = threading.Lock()
+_thread_stats = []
+_retired = ThreadStats()
+
+def _stats():
+    stats = getattr(_local, 'stats', None)
+    if stats is None:
+        stats = _local.stats = ThreadStats(threading.current_thread())
+        with _registry_lock:
+            # Threaded servers start a thread per request, so retire finished ones as we go
+            if len(_thread_stats) >= MAX_THREAD_STATS:
+                _retire_finished()
+            _thread_stats.append(stats)
+    return stats
+
+def _retire_finished():
+    """Fold stats of threads that have exited into _retired; caller holds _registry_lock"""
+    alive = []
+    for stats in _thread_stats:
+        if stats.thread.is_alive():
+            alive.append(stats)
+        else:
+            _retired.merge(stats)
+    _thread_stats[:] = alive
+
+def _observe(table, key, buckets, value):
+    values = table.get(key)
+    if values is None:
+        values = table[key] = [0] * (len(buckets) + 2)
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            values[index] += 1
+            break
+    values[-2] += 1
+    values[-1] += value
+
+def _before_request():
+    # Counters live on the thread, not in g: the cursor hooks below run once per statement
+    _local.request_start = time.perf_counter()
+    _local.sql_count = 0
+    _local.sql_seconds = 0.0
+
+def _after_request(response):
+    start = getattr(_local, 'request_start', None)
+    if start is None:
+        return response
+    _local.request_start = None
+
+    stats = _stats()
+    endpoint = request.endpoint or 'unmatched'
+    _observe(stats.latency, (endpoint, request.method, response.status_code), LATENCY_BUCKETS, time.perf_counter() - start)
+    _observe(stats.queries, endpoint, QUERY_COUNT_BUCKETS, _local.sql_count)
+    stats.query_seconds[endpoint] = stats.query_seconds.get(endpoint, 0) + _local.sql_seconds
+    return response
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _local.query_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_local, 'request_start', None) is not None:
+        _local.sql_count += 1
+        _local.sql_seconds += time.perf_counter() - _local.query_start
+
+def init_metrics(app):
+    """Record per-endpoint latency and SQL usage for /api/admin/metrics"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+def _snapshot():
+    totals = ThreadStats()
+    with _registry_lock:
+        _retire_finished()
+        totals.merge(_retired)
+        live = list(_thread_stats)
+    for stats in live:
+        # Copies are taken without the owner's cooperation; a value may lag by one request
+        snapshot = ThreadStats()
+        snapshot.latency = {key: list(values) for key, values in dict(stats.latency).items()}
+        snapshot.queries = {key: list(values) for key, values in dict(stats.queries).items()}
+        snapshot.query_seconds = dict(stats.query_seconds)
+        totals.merge(snapshot)
+    return totals
+
+def _labels(**labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+def _histogram_lines(name, key_labels, values, buckets):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(buckets, values):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{key_labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{key_labels},le="+Inf"}} {values[-2]}')
+    lines.append(f'{name}_count{{{key_labels}}} {values[-2]}')
+    lines.append(f'{name}_sum{{{key_labels}}} {values[-1]:.6f}')
+    return lines
+
+def render_prometheus():
+    """All metrics for this process in Prometheus text exposition format"""
+    totals = _snapshot()
+    lines = [
+        '# HELP http_request_duration_seconds Request latency by endpoint, method and status.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for (endpoint, method, status), values in sorted(totals.latency.items()):
+        key_labels = _labels(endpoint=endpoint, method=method, status=status)
+        lines += _histogram_lines('http_request_duration_seconds', key_labels, values, LATENCY_BUCKETS)
+
+    lines += [
+        '# HELP db_queries_per_request SQL statements executed per request, by endpoint.',
+        '# TYPE db_queries_per_request histogram',
+    ]
+    for endpoint, values in sorted(totals.queries.items()):
+        lines += _histogram_lines('db_queries_per_request', _labels(endpoint=endpoint), values, QUERY_COUNT_BUCKETS)
+
+    lines += [
+        '# HELP db_query_seconds_total Time spent executing SQL, by endpoint.',
+        '# TYPE db_query_seconds_total counter',
+    ]
+    for endpoint, seconds in sorted(totals.query_seconds.items()):
+        lines.append(f'db_query_seconds_total{{{_labels(endpoint=endpoint)}}} {seconds:.6f}')
+
+    return '\n'.join(lines) + '\n'
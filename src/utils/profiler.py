@@ -0,0 +1,158 @@
+from flask import session
+from datetime import datetime
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'  # X-Profile: 1
+PROFILE_QUERY_FLAG = re.compile(r'(^|&)_profile=1(&|$)')  # ?_profile=1
+PROFILE_ID = re.compile(r'^[0-9A-Za-z_-]+$')
+
+class RequestProfiler:
+    """WSGI middleware that runs a single request under cProfile when an admin asks for it.
+
+    Untriggered requests cost one environ lookup and one substring test;
+    nothing else is touched. A triggered request from anyone but a signed-in
+    admin is served normally, unprofiled.
+    """
+
+    def __init__(self, app, wsgi_app):
+        self.app = app
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        query = environ.get('QUERY_STRING', '')
+        if PROFILE_HEADER not in environ and ('_profile=' not in query or not PROFILE_QUERY_FLAG.search(query)):
+            return self.wsgi_app(environ, start_response)
+        if not self.is_admin(environ):
+            return self.wsgi_app(environ, start_response)
+        return self.profile(environ, start_response)
+
+    def is_admin(self, environ):
+        from src.models.user import db, User
+        with self.app.request_context(environ.copy()):
+            user_id = session.get('user_id')
+            user = db.session.get(User, user_id) if user_id else None
+            return bool(user and user.is_admin and user.is_active)
+
+    def profile(self, environ, start_response):
+        profile_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        status_holder = []
+
+        def profiled_start_response(status, headers, exc_info=None):
+            status_holder.append(status)
+            return start_response(status, headers + [('X-Profile-Id', profile_id)], exc_info)
+
+        def finish(profiler, started):
+            self.save(profile_id, profiler, {
+                'id': profile_id,
+                'time': datetime.utcnow().isoformat(),
+                'method': environ.get('REQUEST_METHOD'),
+                'path': environ.get('PATH_INFO'),
+                'query': PROFILE_QUERY_FLAG.sub(r'\2', environ.get('QUERY_STRING', '')).strip('&'),
+                'status': status_holder[0] if status_holder else None,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            })
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            app_iter = self.wsgi_app(environ, profiled_start_response)
+        except BaseException:
+            profiler.disable()
+            finish(profiler, started)
+            raise
+        profiler.disable()
+        # Streamed bodies (exports, event streams) are passed through chunk by chunk,
+        # profiled while each chunk is produced; the profile is saved when the server closes the body
+        return ProfiledBody(app_iter, profiler, lambda: finish(profiler, started))
+
+    def save(self, profile_id, profiler, metadata):
+        directory = self.app.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(directory, f'{profile_id}.pstats'))
+        with open(os.path.join(directory, f'{profile_id}.json'), 'w') as f:
+            json.dump(metadata, f)
+        prune_profiles(directory, self.app.config['PROFILES_KEEP'])
+
+class ProfiledBody:
+    """WSGI body that runs the profiler only while the wrapped body produces a chunk"""
+
+    def __init__(self, app_iter, profiler, on_close):
+        self.app_iter = app_iter
+        self.iterator = iter(app_iter)
+        self.profiler = profiler
+        self.on_close = on_close
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.profiler.enable()
+        try:
+            return next(self.iterator)
+        finally:
+            self.profiler.disable()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if hasattr(self.app_iter, 'close'):
+                self.profiler.enable()
+                try:
+                    self.app_iter.close()
+                finally:
+                    self.profiler.disable()
+        finally:
+            self.on_close()
+
+def prune_profiles(directory, keep):
+    """Delete all but the newest `keep` profiles"""
+    for metadata in list_profiles(directory)[keep:]:
+        for extension in ('pstats', 'json'):
+            try:
+                os.remove(os.path.join(directory, f"{metadata['id']}.{extension}"))
+            except FileNotFoundError:
+                pass
+
+def list_profiles(directory):
+    """Metadata of stored profiles, newest first (ids start with a UTC timestamp)"""
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # Being written or pruned by another worker
+    return profiles
+
+def profile_path(directory, profile_id):
+    """Path of a stored .pstats file, or None for unknown or malformed ids"""
+    if not PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(directory, f'{profile_id}.pstats')
+    return path if os.path.isfile(path) else None
+
+def profile_text(path, sort='cumulative', limit=60):
+    """Human-readable pstats report"""
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+def init_profiler(app):
+    """Let admins profile a single request with `X-Profile: 1` or `?_profile=1`"""
+    app.wsgi_app = RequestProfiler(app, app.wsgi_app)
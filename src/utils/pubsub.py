@@ -0,0 +1,150 @@
+"""In-process publish/subscribe behind the server-sent event streams.
+
+Every subscriber gets a bounded queue. One that falls too far behind is
+ended once its queue drains instead of buffering without limit; the
+browser reconnects with Last-Event-ID and the missed events are replayed
+from a ring buffer of recent history. Everything lives in this process, so
+with several prefork workers a stream sees the events its own worker
+published.
+"""
+from flask import Response, current_app, request
+from collections import deque, namedtuple
+import json
+import os
+import queue
+import threading
+import time
+
+EVENT_HISTORY = 1000  # Recent events kept for Last-Event-ID resume
+RETRY_MS = 3000  # Browser reconnect delay after a stream ends
+
+Event = namedtuple('Event', ['number', 'id', 'name', 'topics', 'data'])
+
+class Subscription:
+    def __init__(self, broker, topics, queue_size):
+        self.broker = broker
+        self.topics = frozenset(topics)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True  # Publishers never block on a slow client
+
+    def get(self, timeout):
+        """Next event, or None after `timeout` seconds without one"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+class Broker:
+    def __init__(self, history_size=EVENT_HISTORY):
+        self.history_size = history_size
+        self.reset()
+        # A forked worker starts from the master's copy; give it its own ids and subscribers
+        os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        self.lock = threading.Lock()
+        self.epoch = f'{int(time.time()):x}{os.getpid():x}'  # Ids from another process never resume here
+        self.last_number = 0
+        self.history = deque(maxlen=self.history_size)
+        self.subscribers = set()
+
+    def publish(self, topics, name, data):
+        with self.lock:
+            self.last_number += 1
+            event = Event(self.last_number, f'{self.epoch}-{self.last_number}', name, frozenset(topics), data)
+            self.history.append(event)
+            for subscription in self.subscribers:
+                if subscription.topics & event.topics:
+                    subscription.deliver(event)
+        return event
+
+    def subscribe(self, topics, queue_size, last_event_id=None):
+        """Returns (subscription, events to replay, whether events were lost for good).
+
+        Registration and replay happen under one lock, so nothing published in
+        between is either missed or delivered twice.
+        """
+        with self.lock:
+            subscription = Subscription(self, topics, queue_size)
+            self.subscribers.add(subscription)
+            if not last_event_id:
+                return subscription, [], False
+
+            epoch, _, number = last_event_id.rpartition('-')
+            if epoch != self.epoch or not number.isdigit():
+                return subscription, [], True  # Another process or an earlier run
+            number = int(number)
+            oldest = self.history[0].number if self.history else self.last_number + 1
+            replay = [event for event in self.history if event.number > number and event.topics & subscription.topics]
+            return subscription, replay, number < oldest - 1
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+broker = Broker()
+
+def format_event(event):
+    return f'id: {event.id}\nevent: {event.name}\ndata: {json.dumps(event.data)}\n\n'
+
+def event_stream(subscription, replay=(), lost=False, heartbeat=15):
+    """text/event-stream body: replayed events, then live ones, with comment heartbeats"""
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        if lost:
+            # The client's position is gone; it must refetch before trusting the stream again
+            yield 'event: reset\ndata: {}\n\n'
+        for event in replay:
+            yield format_event(event)
+        while True:
+            if subscription.overflowed and subscription.queue.empty():
+                return  # Reconnect resumes from history via Last-Event-ID
+            event = subscription.get(heartbeat)
+            # Heartbeats keep proxies from timing out idle streams and surface dead clients
+            yield format_event(event) if event else ': heartbeat\n\n'
+    finally:
+        subscription.close()
+
+def stream_response(topics):
+    """Subscribe this request to `topics` and stream to it, resuming from Last-Event-ID"""
+    config = current_app.config
+    subscription, replay, lost = broker.subscribe(
+        topics, config['SSE_QUEUE_SIZE'], request.headers.get('Last-Event-ID')
+    )
+    # No stream_with_context: the app context (and its DB session) ends before streaming starts
+    response = Response(
+        event_stream(subscription, replay, lost, config['SSE_HEARTBEAT_SECONDS']),
+        mimetype='text/event-stream'
+    )
+    response.call_on_close(subscription.close)  # Also covers a body that is never iterated
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: pass events through unbuffered
+    return response
+
+# Order status streams
+
+ADMIN_ORDERS_TOPIC = 'orders'
+
+def user_orders_topic(user_id):
+    return f'orders:user:{user_id}'
+
+def publish_order(order):
+    """Announce an order's status to its owner's stream and the admin stream; call after commit"""
+    return broker.publish(
+        [ADMIN_ORDERS_TOPIC, user_orders_topic(order.user_id)],
+        'order',
+        {
+            'order_id': order.id,
+            'status': order.status,
+            'updated_at': order.updated_at.isoformat() if order.updated_at else None
+        }
+    )
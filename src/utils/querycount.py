@@ -0,0 +1,67 @@
+from collections import Counter
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import re
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\s*\?\s*,)*\s*\?\s*\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_sql(statement):
+    """Statement shape: literals become ?, IN lists collapse, whitespace is squeezed"""
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _IN_LIST.sub('IN (...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+class QueryCounter:
+    """SQL statements executed while a count_queries() block was open"""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def duplicates(self):
+        """Statement shapes run more than once, most repeated first; the usual N+1 signature"""
+        shapes = Counter(normalize_sql(statement) for statement in self.statements)
+        return [(shape, count) for shape, count in shapes.most_common() if count > 1]
+
+    def report(self):
+        lines = [f'{self.count} statements']
+        for shape, count in self.duplicates():
+            lines.append(f'  {count}x {shape}')
+        return '\n'.join(lines)
+
+@contextmanager
+def count_queries():
+    """Record every statement executed on any engine inside the block"""
+    counter = QueryCounter()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    event.listen(Engine, 'after_cursor_execute', record)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, 'after_cursor_execute', record)
+
+@contextmanager
+def query_budget(limit, label='block'):
+    """Raise QueryBudgetExceeded if the block runs more than `limit` statements.
+
+        with query_budget(4, 'GET /api/orders'):
+            client.get('/api/orders')
+    """
+    with count_queries() as counter:
+        yield counter
+    if counter.count > limit:
+        raise QueryBudgetExceeded(f'{label} ran {counter.count} SQL statements (budget {limit})\n{counter.report()}')
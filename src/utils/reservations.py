@@ -0,0 +1,90 @@
+from flask import current_app
+from datetime import datetime, timedelta
+from src.models.user import db
+from src.models.product import Product, StockReservation
+import threading
+import time
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id, available):
+        super().__init__(f'Not enough stock for product {product_id}')
+        self.product_id = product_id
+        self.available = max(available, 0)
+
+def available_stock(product_ids, user_id):
+    """stock_quantity minus other users' live reservations, per product id.
+
+    Call it after the transaction's first write: SQLite then holds the write
+    lock (PostgreSQL callers lock the product rows), so the numbers cannot
+    change before commit.
+    """
+    reserved = db.select(
+        StockReservation.product_id,
+        db.func.sum(StockReservation.quantity).label('quantity')
+    ).where(
+        StockReservation.product_id.in_(product_ids),
+        StockReservation.expires_at > datetime.utcnow(),
+        StockReservation.user_id != user_id
+    ).group_by(StockReservation.product_id).subquery()
+
+    rows = db.session.execute(
+        db.select(Product.id, Product.stock_quantity - db.func.coalesce(reserved.c.quantity, 0))
+        .outerjoin(reserved, reserved.c.product_id == Product.id)
+        .where(Product.id.in_(product_ids))
+    ).all()
+    return dict(rows)
+
+def reserve(user_id, product_id, quantity):
+    """Hold `quantity` units for the user's cart line, replacing any earlier hold.
+
+    Raises InsufficientStock if other carts already hold too much; the
+    caller commits on success and rolls back on failure.
+    """
+    expires_at = datetime.utcnow() + timedelta(minutes=current_app.config['RESERVATION_MINUTES'])
+    reservation = StockReservation.query.filter_by(user_id=user_id, product_id=product_id).first()
+    if reservation is None:
+        reservation = StockReservation(user_id=user_id, product_id=product_id)
+        db.session.add(reservation)
+    reservation.quantity = quantity
+    reservation.expires_at = expires_at
+
+    # Write first, check second: the flush is what serializes concurrent carts
+    db.session.flush()
+    available = available_stock([product_id], user_id).get(product_id, 0)
+    if quantity > available:
+        raise InsufficientStock(product_id, available)
+    return reservation
+
+def release(user_id, product_ids=None):
+    """Drop the user's reservations (for some products, or all of them)"""
+    query = StockReservation.query.filter_by(user_id=user_id)
+    if product_ids is not None:
+        query = query.filter(StockReservation.product_id.in_(product_ids))
+    query.delete(synchronize_session=False)
+
+def sweep_expired_reservations():
+    """Delete reservations past their expiry; they already stopped counting against stock"""
+    removed = StockReservation.query.filter(
+        StockReservation.expires_at <= datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+def start_reservation_sweeper(app):
+    """Sweep expired reservations every RESERVATION_SWEEP_SECONDS in a daemon thread"""
+    interval = app.config['RESERVATION_SWEEP_SECONDS']
+    if not interval:
+        return None
+
+    def sweep_forever():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    sweep_expired_reservations()
+            except Exception as e:
+                app.logger.warning('Reservation sweep failed: %s', e)
+
+    thread = threading.Thread(target=sweep_forever, name='reservation-sweeper', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,178 @@
+from flask import has_request_context, request
+from logging.handlers import RotatingFileHandler
+from sqlalchemy import event
+from datetime import datetime
+from src.models.user import db
+from src.utils.querycount import normalize_sql
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+MAX_EXPLAINED_SHAPES = 5000  # Stop explaining new shapes past this; the set lives for the process
+EXPLAIN_PREFIXES = {'sqlite': 'EXPLAIN QUERY PLAN ', 'postgresql': 'EXPLAIN '}
+
+logger = logging.getLogger('slow_queries')
+logger.propagate = False
+
+_local = threading.local()
+_explained_lock = threading.Lock()
+_explained_shapes = set()
+
+class SharedRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that every prefork worker can append to.
+
+    Each write (and with it the size check and rollover) happens under an
+    exclusive flock on `<log>.lock`, and a process whose file has been
+    rotated away by another one reopens the new file first, instead of
+    appending to (and rotating again) the renamed backup.
+    """
+
+    def emit(self, record):
+        with open(f'{self.baseFilename}.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # Released when the lock file is closed
+            if self.stream is not None and self.rotated_away():
+                self.stream.close()
+                self.stream = None  # Reopened by the emit below
+            super().emit(record)
+
+    def rotated_away(self):
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            return True
+        opened = os.fstat(self.stream.fileno())
+        return (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino)
+
+def parameter_shape(parameters, executemany=False):
+    """Types of the bound values, never the values themselves (they can hold emails or hashes)"""
+    if executemany:
+        rows = list(parameters or ())
+        return {'rows': len(rows), 'row': parameter_shape(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+def full_scans(dialect_name, plan):
+    """Plan lines that read a whole table rather than seeking through an index"""
+    if dialect_name == 'sqlite':
+        # 'SCAN users' is a table scan; 'SCAN users USING COVERING INDEX ...' only walks an index
+        return [line for line in plan if line.startswith('SCAN ') and ' USING ' not in line]
+    return [line.strip() for line in plan if 'Seq Scan' in line]
+
+def explain(conn, statement, parameters):
+    """Query plan lines, run on a fresh DBAPI cursor so the pending result is untouched"""
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None:
+        return None
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    # SQLite rows are (id, parent, notused, detail); PostgreSQL rows are one text column
+    return [row[-1] for row in rows]
+
+def first_sighting(shape):
+    with _explained_lock:
+        if shape in _explained_shapes or len(_explained_shapes) >= MAX_EXPLAINED_SHAPES:
+            return False
+        _explained_shapes.add(shape)
+        return True
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _local.start = time.perf_counter()
+
+def _make_after_cursor_execute(threshold_ms):
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(_local, 'start', None)
+        if start is None:
+            return
+        duration_ms = (time.perf_counter() - start) * 1000
+        if duration_ms < threshold_ms:
+            return
+
+        shape = normalize_sql(statement)
+        entry = {
+            'time': datetime.utcnow().isoformat(),
+            'duration_ms': round(duration_ms, 2),
+            'sql': shape,
+            'params': parameter_shape(parameters, executemany),
+            'endpoint': request.endpoint if has_request_context() else None,
+            'method': request.method if has_request_context() else None,
+            'database': conn.engine.url.database,
+        }
+
+        # Plans are captured once per statement shape; later sightings just log the timing
+        if not executemany and shape.upper().startswith(('SELECT', 'WITH')) and first_sighting(shape):
+            try:
+                plan = explain(conn, statement, parameters)
+            except Exception as e:
+                plan, entry['explain_error'] = None, str(e)
+            if plan is not None:
+                entry['plan'] = plan
+                entry['full_scans'] = full_scans(conn.dialect.name, plan)
+
+        logger.warning(json.dumps(entry))
+    return after_cursor_execute
+
+def init_slow_query_log(app):
+    """Log statements slower than SLOW_QUERY_MS as JSON lines to SLOW_QUERY_LOG"""
+    log_path = app.config.get('SLOW_QUERY_LOG')
+    if not log_path:
+        return
+
+    if not any(getattr(handler, 'baseFilename', None) == os.path.abspath(log_path) for handler in logger.handlers):
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+        handler = SharedRotatingFileHandler(
+            log_path,
+            maxBytes=app.config['SLOW_QUERY_LOG_BYTES'],
+            backupCount=app.config['SLOW_QUERY_LOG_BACKUPS'],
+            delay=True
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.WARNING)
+
+    after_cursor_execute = _make_after_cursor_execute(app.config['SLOW_QUERY_MS'])
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+def read_slow_queries(log_path, limit=100, block_size=64 * 1024):
+    """Newest `limit` entries, from the end of the log and then its rotated backups, reading only as much as needed"""
+    entries = []
+    backup = 0
+    path = log_path
+    while len(entries) < limit and os.path.exists(path):
+        entries += read_log_tail(path, limit - len(entries), block_size)
+        backup += 1
+        path = f'{log_path}.{backup}'
+    return entries
+
+def read_log_tail(path, limit, block_size):
+    """Newest `limit` entries of one log file, newest first"""
+    if limit <= 0:
+        return []  # data.splitlines()[-0:] below would be every line read
+
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+        while position > 0 and data.count(b'\n') <= limit:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+
+    entries = []
+    for line in reversed(data.splitlines()[-limit:]):
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue  # Partial first line of the window, or a line cut by rotation
+    return entries
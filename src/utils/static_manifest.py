@@ -0,0 +1,95 @@
+from flask import Response, request, send_file
+from datetime import datetime, timezone
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+# Vite-style content-hashed bundles, e.g. assets/index-D91lh6Wb.js
+HASHED_ASSET = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8,}\.[a-z0-9]+$')
+COMPRESSIBLE_EXTENSIONS = {'.js', '.css', '.html', '.svg', '.json', '.ico', '.txt', '.map', '.xml', '.webmanifest'}
+MIN_COMPRESS_SIZE = 1024
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+DEFAULT_CACHE = 'public, max-age=86400'  # Unhashed files (logo, favicon) revalidate by ETag daily
+
+class StaticEntry:
+    __slots__ = ('path', 'size', 'etag', 'last_modified', 'mimetype', 'gzip', 'cache_control')
+
+    def __init__(self, path, size, etag, last_modified, mimetype, gzip_data, cache_control):
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.mimetype = mimetype
+        self.gzip = gzip_data
+        self.cache_control = cache_control
+
+def build_static_manifest(static_folder, skip_dirs=('uploads',)):
+    """Walk the static tree once and describe every file by its URL path.
+
+    Each entry carries its size, a content ETag, cache policy and, for text
+    assets that shrink meaningfully, a pre-compressed gzip body. Runtime
+    directories such as uploads are left out because they change after startup.
+    """
+    manifest = {}
+    if not static_folder or not os.path.isdir(static_folder):
+        return manifest
+
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder:
+            dirs[:] = [d for d in dirs if d not in skip_dirs]
+        for filename in files:
+            path = os.path.join(root, filename)
+            url_path = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            gzip_data = None
+            extension = os.path.splitext(filename)[1].lower()
+            if extension in COMPRESSIBLE_EXTENSIONS and len(data) >= MIN_COMPRESS_SIZE:
+                compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                if len(compressed) < len(data) * 0.9:
+                    gzip_data = compressed
+
+            if HASHED_ASSET.match(url_path):
+                cache_control = IMMUTABLE_CACHE
+            elif url_path == 'index.html':
+                cache_control = REVALIDATE_CACHE
+            else:
+                cache_control = DEFAULT_CACHE
+
+            manifest[url_path] = StaticEntry(
+                path=path,
+                size=len(data),
+                etag=hashlib.md5(data).hexdigest(),
+                last_modified=datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc),
+                mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                gzip_data=gzip_data,
+                cache_control=cache_control
+            )
+    return manifest
+
+def send_static_entry(entry):
+    """Serve a manifest entry, preferring its gzip body when the client accepts it"""
+    if entry.gzip is not None and 'gzip' in request.accept_encodings:
+        response = Response(entry.gzip, mimetype=entry.mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(f"{entry.etag}-gz")
+        response.last_modified = entry.last_modified
+        response.make_conditional(request)
+    else:
+        response = send_file(
+            entry.path,
+            mimetype=entry.mimetype,
+            etag=entry.etag,
+            last_modified=entry.last_modified,
+            max_age=None
+        )
+
+    if entry.gzip is not None:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = entry.cache_control
+    return response
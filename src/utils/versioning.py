@@ -0,0 +1,39 @@
+from flask import request, jsonify
+import re
+
+ENTITY_TAG = re.compile(r'^(?:W/)?"?(\d+)(?:-gz)?"?$')  # "3", W/"3" or a bare 3
+
+class InvalidVersion(ValueError):
+    pass
+
+def requested_versions(data):
+    """Versions the client will accept, from If-Match or a `version` field; None if neither was sent.
+
+    If-Match may list several tags ("3", "4"); the write proceeds if the
+    current version is any of them. Only `If-Match: *` means "no precondition".
+    """
+    header = request.headers.get('If-Match', '').strip()
+    if header == '*':
+        return None
+    if header:
+        versions = set()
+        for tag in header.split(','):
+            match = ENTITY_TAG.match(tag.strip())
+            if not match:
+                raise InvalidVersion('If-Match must list version numbers')
+            versions.add(int(match.group(1)))
+        return versions
+    if data and data.get('version') is not None:
+        try:
+            return {int(data['version'])}
+        except (TypeError, ValueError):
+            raise InvalidVersion('version must be an integer')
+    return None
+
+def version_conflict(current):
+    """409 carrying the row as it is now, so the client can merge and retry"""
+    return jsonify({
+        'error': 'Modified by another request; reload and retry',
+        'version': current.version_id if current else None,
+        'current': current.to_dict() if current else None
+    }), 409